@@ -0,0 +1,76 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time of minimizing the distance to fluxomics sets of increasing size.
+
+Observations are drawn with noise from a parsimonious flux distribution of iJO1366
+with a fixed growth rate, as `minimize_distance` does for fluxomics requests, and the
+distance is minimized with each of the formulations of `adjust_fluxes2model`:
+
+* milp: a binary variable for the direction of every observed flux,
+* auto: binary variables only for observed fluxes of reversible reactions,
+* lp: the signs of the observations are trusted.
+
+Problems that are not solved within the time limit are reported as such.
+
+Usage: python benchmarks/flux_adjustment.py [time limit in seconds]
+"""
+
+import logging
+import sys
+import time
+
+import numpy as np
+from cobra.flux_analysis import pfba
+from cobra.io import read_sbml_model
+
+from simulations.modeling.driven import adjust_fluxes2model
+
+
+SIZES = [5, 10, 20, 40, 80]
+
+
+def main(timeout=60):
+    logging.disable(logging.WARNING)
+    model = read_sbml_model("tests/data/iJO1366.xml.gz")
+    model.solver.configuration.timeout = timeout
+    biomass = model.reactions.BIOMASS_Ec_iJO1366_core_53p95M
+    fluxes = pfba(model).fluxes
+    biomass.bounds = fluxes[biomass.id], fluxes[biomass.id]
+    candidates = fluxes[(fluxes.abs() > 1e-6) & (fluxes.index != biomass.id)]
+    random = np.random.RandomState(0)
+    for size in SIZES:
+        observed = candidates.sample(size, random_state=random)
+        observations = observed * random.normal(1, 0.1, size)
+        reversible = sum(
+            model.reactions.get_by_id(r).reversibility for r in observed.index
+        )
+        print(f"{size} observations ({reversible} reversible):")
+        for label, formulation in (("milp", "milp"), ("auto", None), ("lp", "lp")):
+            start = time.time()
+            try:
+                with model:
+                    solution = adjust_fluxes2model(
+                        model, observations, formulation=formulation
+                    )
+            except Exception as error:
+                result = type(error).__name__
+            else:
+                result = f"distance {solution.objective_value:.3f}"
+            print(f"  {label:>4}: {time.time() - start:.2f}s, {result}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
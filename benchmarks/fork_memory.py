@@ -0,0 +1,91 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the private memory of forked workers sharing preloaded models.
+
+The test models are loaded in a parent process, which then forks workers the way
+gunicorn does with `preload_app`. Every worker runs a full garbage collection and
+optimizes each model once, and then reports its private (unshared) memory. As in
+`gunicorn.py`, the garbage collector is disabled in the parent and re-enabled in every
+worker. The benchmark is run once without and once with the preloaded objects frozen
+by `gc.freeze()` just before forking.
+
+Usage: python benchmarks/fork_memory.py [workers]
+"""
+
+import gc
+import json
+import os
+import sys
+
+from cobra.io import read_sbml_model
+
+
+MODELS = ["e_coli_core", "iJO1366", "eciML1515"]
+
+
+def private_memory():
+    """Return the private memory in MiB of the current process."""
+    total = 0
+    with open("/proc/self/smaps_rollup") as file_:
+        for line in file_:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total / 1024
+
+
+def fork_workers(models, workers):
+    """Fork workers that use the given models and return their private memory."""
+    results = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            gc.enable()
+            # Simulate a worker serving a request on every model.
+            gc.collect()
+            for model in models:
+                model.slim_optimize()
+            with os.fdopen(write_fd, "w") as file_:
+                file_.write(json.dumps(private_memory()))
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as file_:
+            results.append(json.loads(file_.read()))
+        os.waitpid(pid, 0)
+    return results
+
+
+def main(workers):
+    gc.disable()
+    models = [read_sbml_model(f"tests/data/{model}.xml.gz") for model in MODELS]
+    print(f"Parent process after loading {len(models)} models: {private_memory():.1f} MiB")
+
+    for freeze in (False, True):
+        if freeze:
+            gc.freeze()
+        results = fork_workers(models, workers)
+        if freeze:
+            gc.unfreeze()
+        print(
+            f"gc.freeze() {'enabled' if freeze else 'disabled'}: private memory per "
+            f"worker {sum(results) / len(results):.1f} MiB, {sum(results):.1f} MiB for "
+            f"{workers} workers"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
@@ -0,0 +1,105 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time of applying and undoing operations on a shared model.
+
+A list of operations modifying the bounds of many reactions and knocking out some
+genes is applied to each test model, and undone again:
+
+* as operations were applied before, one at a time within a model context,
+* with `apply_operations` within a model context,
+* with `apply_operations` within a checkpoint, as done when handling requests.
+
+Usage: python benchmarks/model_checkpoint.py [model ...]
+"""
+
+import statistics
+import sys
+import time
+
+from cobra.io import read_sbml_model
+
+from simulations.modeling.cobra_helpers import checkpoint
+from simulations.modeling.operations import apply_operations
+
+
+MODELS = ["iJO1366", "eciML1515"]
+REPEATS = 20
+
+
+def make_operations(model, reactions=500, genes=20):
+    operations = [
+        {
+            "operation": "modify",
+            "type": "reaction",
+            "id": reaction.id,
+            "data": {"id": reaction.id, "lower_bound": -5.0, "upper_bound": 5.0},
+        }
+        for reaction in model.reactions[:reactions]
+    ]
+    operations += [
+        {"operation": "knockout", "type": "gene", "id": gene.id}
+        for gene in model.genes[:genes]
+    ]
+    return operations
+
+
+def apply_each(model, operations):
+    for operation in operations:
+        if operation["type"] == "reaction":
+            model.reactions.get_by_id(operation["id"]).bounds = (
+                operation["data"]["lower_bound"],
+                operation["data"]["upper_bound"],
+            )
+        else:
+            model.genes.get_by_id(operation["id"]).knock_out()
+
+
+def measure(model, operations, apply, context):
+    """Return the median durations in seconds of applying and undoing operations."""
+    apply_durations = []
+    undo_durations = []
+    for _ in range(REPEATS):
+        with context(model):
+            start = time.time()
+            apply(model, operations)
+            middle = time.time()
+        end = time.time()
+        apply_durations.append(middle - start)
+        undo_durations.append(end - middle)
+    return statistics.median(apply_durations), statistics.median(undo_durations)
+
+
+def main(models):
+    for name in models:
+        model = read_sbml_model(f"tests/data/{name}.xml.gz")
+        operations = make_operations(model)
+        bounds = [reaction.bounds for reaction in model.reactions]
+        print(f"{name} ({len(operations)} operations):")
+        for label, apply, context in (
+            ("each", apply_each, lambda model: model),
+            ("context", apply_operations, lambda model: model),
+            ("checkpoint", apply_operations, checkpoint),
+        ):
+            apply_duration, undo_duration = measure(model, operations, apply, context)
+            assert [reaction.bounds for reaction in model.reactions] == bounds
+            print(
+                f"  {label:>10}: apply {apply_duration * 1000:.1f} ms, "
+                f"undo {undo_duration * 1000:.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or MODELS)
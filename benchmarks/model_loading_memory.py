@@ -0,0 +1,98 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the peak memory of deserializing models received from the model warehouse.
+
+Each test model is serialized into a warehouse-like JSON document on disk. The model
+is then loaded the way `storage._load_model` used to, by keeping the whole response
+body and parsing it into a dict before calling `cobra.io.model_from_dict`, and the
+way it does now, by building the model while streaming the spooled document. Peak
+memory is traced with `tracemalloc` and reported relative to the size of the model.
+
+Usage: python benchmarks/model_loading_memory.py [model ...]
+"""
+
+import gc
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from cobra.io import read_sbml_model
+from cobra.io.dict import model_from_dict, model_to_dict
+
+from simulations.modeling.serialization import read_model_document
+
+
+MODELS = ["e_coli_core", "iJO1366", "eciML1515"]
+
+
+def load_dict(file_):
+    content = file_.read()
+    model_data = json.loads(content.decode("utf-8"))
+    return model_from_dict(model_data["model_serialized"])
+
+
+def load_stream(file_):
+    model_data = read_model_document(
+        io.TextIOWrapper(file_, encoding="utf-8"), "model_serialized"
+    )
+    return model_data["model_serialized"]
+
+
+def measure(load, path):
+    """Return the loaded model size, peak memory in MiB and duration in seconds."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    with open(path, "rb") as file_:
+        model = load(file_)
+    duration = time.time() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del model
+    return size / 1024 ** 2, peak / 1024 ** 2, duration
+
+
+def main(models):
+    for name in models:
+        model = read_sbml_model(f"tests/data/{name}.xml.gz")
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file_:
+            json.dump(
+                {
+                    "id": 1,
+                    "model_serialized": model_to_dict(model),
+                    "project_id": None,
+                    "organism_id": 1,
+                    "default_biomass_reaction": "",
+                    "ec_model": False,
+                },
+                file_,
+            )
+            file_.flush()
+            del model
+            print(f"{name} ({file_.tell() / 1024 ** 2:.1f} MiB document):")
+            for label, load in (("dict", load_dict), ("stream", load_stream)):
+                size, peak, duration = measure(load, file_.name)
+                print(
+                    f"  {label:>6}: model {size:.1f} MiB, peak {peak:.1f} MiB "
+                    f"({peak / size:.2f}x), {duration:.2f}s"
+                )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or MODELS)
@@ -0,0 +1,126 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the peak memory of parsing a chebi ontology in `scripts/update_salts.py`.
+
+The ontology is parsed the way `update_salts.main` used to, by reading and decoding
+the whole file and splitting it into sections before parsing them, and the way it
+does now, by streaming the "Term" sections of the file to the process pool in
+batches. Peak memory of the main process is traced with `tracemalloc` and compared
+to the memory retained by the parsed chemicals.
+
+Without arguments, a fixture ontology resembling chebi.obo is generated.
+
+Usage: python benchmarks/obo_parsing.py [chebi.obo]
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from multiprocessing import Pool
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import update_salts  # noqa: E402
+
+
+TERM = """[Term]
+id: CHEBI:{index}
+name: compound {index}
+subset: 3_STAR
+def: "A fixture compound used to benchmark the parsing of the chebi ontology." []
+synonym: "compound {index}" RELATED [ChEBI]
+xref: KEGG:C{index:05d} "KEGG COMPOUND"
+is_a: CHEBI:{parent}
+property_value: http://purl.obolibrary.org/obo/chebi/formula "C6H12O6" xsd:string
+property_value: http://purl.obolibrary.org/obo/chebi/charge "0" xsd:string
+property_value: http://purl.obolibrary.org/obo/chebi/mass "180.156" xsd:string
+property_value: http://purl.obolibrary.org/obo/chebi/inchi "InChI=1S/C{index}H2.Na/h{index}H;/q;+1" xsd:string
+property_value: http://purl.obolibrary.org/obo/chebi/inchikey "WQZGKKKJIJFFOK-GASJEMHNSA-N" xsd:string
+property_value: http://purl.obolibrary.org/obo/chebi/smiles "OC[C@H]1OC(O)[C@H](O)[C@@H]{index}.[Na+]" xsd:string
+
+"""  # noqa: E501
+
+# Many terms of the chebi ontology, such as classes and roles, have no structure.
+CLASS_TERM = """[Term]
+id: CHEBI:{index}
+name: class {index}
+def: "A fixture class used to benchmark the parsing of the chebi ontology." []
+is_a: CHEBI:{parent}
+
+"""
+
+
+def write_fixture(file_, terms=100000):
+    file_.write("format-version: 1.2\nontology: chebi\n\n")
+    for index in range(1, terms + 1):
+        term = CLASS_TERM if index % 3 == 0 else TERM
+        file_.write(term.format(index=index, parent=index // 2 + 1))
+    file_.write("[Typedef]\nid: has_part\nname: has part\n")
+
+
+def parse_whole(pool, path):
+    with open(path, "rb") as file_:
+        sections = file_.read().decode("iso-8859-1").split("\n\n")
+    all_chemicals, smiles, inchi, inchi_formula = [], {}, {}, {}
+    for section in sections:
+        if section.startswith("[Term]"):
+            chemical = update_salts.parse_obo_term_section(section)
+            if chemical is not None:
+                update_salts.add_chemical(
+                    chemical, all_chemicals, smiles, inchi, inchi_formula
+                )
+    return all_chemicals
+
+
+def parse_stream(pool, path):
+    with open(path, encoding="iso-8859-1") as file_:
+        return update_salts.read_chemicals(pool, file_)[0]
+
+
+def measure(parse, pool, path):
+    """Return the number of chemicals, retained and peak memory in MiB and duration."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    chemicals = parse(pool, path)
+    duration = time.time() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(chemicals), size / 1024 ** 2, peak / 1024 ** 2, duration
+
+
+def main(path=None):
+    with tempfile.NamedTemporaryFile("w", suffix=".obo") as fixture:
+        if path is None:
+            write_fixture(fixture)
+            fixture.flush()
+            path = fixture.name
+        print(f"{path} ({os.path.getsize(path) / 1024 ** 2:.1f} MiB):")
+        with Pool(processes=os.cpu_count()) as pool:
+            for label, parse in (("whole", parse_whole), ("stream", parse_stream)):
+                chemicals, size, peak, duration = measure(parse, pool, path)
+                print(
+                    f"  {label:>6}: {chemicals} chemicals {size:.1f} MiB, "
+                    f"peak {peak:.1f} MiB, {duration:.2f}s"
+                )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,137 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time of flexibilizing proteomics sets of increasing size.
+
+Abundances of randomly chosen proteins of eciML1515 are drawn log-uniformly, so that
+many of them limit growth. The sets are flexibilized the way `flexibilize_proteomics`
+used to, with a pandas table of proteins built by substring queries and a full
+solution for every removed protein, and the way it does now. Both must remove the same
+proteins in the same order. The current implementation is also run with several
+proteins removed per iteration.
+
+GLPK occasionally fails to solve these problems, so every optimization is limited to the
+given number of seconds, and runs ending without an optimal solution are reported as
+such.
+
+Usage: python benchmarks/proteomics_flexibilization.py [time limit] [size ...]
+"""
+
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from cobra.io import read_sbml_model
+
+from simulations.modeling.driven import bounds, flexibilize_proteomics
+
+
+SIZES = [50, 200, 800]
+
+
+def flexibilize_before(model, biomass_reaction, growth_rate, proteomics):
+    model.reactions.get_by_id(biomass_reaction).bounds = (0, 1000)
+    prot_df = pd.DataFrame()
+    for protein in proteomics:
+        protein_id = protein["identifier"]
+        lb, ub = bounds(protein["measurement"], protein["uncertainty"])
+        for met in model.metabolites.query(lambda m: protein_id in m.id):
+            new_row = pd.DataFrame(
+                data={"met_id": met.id, "value": ub}, index=[protein_id]
+            )
+            prot_df = pd.concat([prot_df, new_row])
+    for protein_id, measure in prot_df["value"].items():
+        model.reactions.get_by_id(f"prot_{protein_id}_exchange").bounds = (0, measure)
+    solution = model.optimize()
+    new_growth_rate = solution.objective_value
+    minimal_growth = bounds(growth_rate["measurement"], growth_rate["uncertainty"])[0]
+    minimal_growth *= 1.05
+    warnings = []
+    while new_growth_rate < minimal_growth and not prot_df.empty:
+        shadow_pr = solution.shadow_prices
+        shadow_pr = shadow_pr.loc[shadow_pr.index.isin(list(prot_df["met_id"]))]
+        top_protein = shadow_pr.sort_values()[:1].index[0]
+        top_protein = prot_df.index[prot_df["met_id"] == top_protein][0]
+        prot_df = prot_df.drop(labels=top_protein)
+        model.reactions.get_by_id(f"prot_{top_protein}_exchange").bounds = (0, 1000)
+        warnings.append(top_protein)
+        solution = model.optimize()
+        if solution.objective_value == new_growth_rate:
+            break
+        new_growth_rate = solution.objective_value
+    if new_growth_rate < minimal_growth:
+        return new_growth_rate, warnings
+    return growth_rate["measurement"], warnings
+
+
+def flexibilize_after(model, biomass_reaction, growth_rate, proteomics, k=1):
+    growth_rate, proteomics, warnings = flexibilize_proteomics(
+        model, biomass_reaction, dict(growth_rate), list(proteomics), [], k
+    )
+    return growth_rate["measurement"], [w.split("'")[1] for w in warnings]
+
+
+def main(timeout=30, sizes=SIZES):
+    logging.disable(logging.WARNING)
+    model = read_sbml_model("tests/data/eciML1515.xml.gz")
+    biomass_reaction = "BIOMASS_Ec_iML1515_core_75p37M"
+    proteins = sorted(
+        r.id[len("prot_") : -len("_exchange")]
+        for r in model.reactions
+        if r.id.startswith("prot_") and r.id.endswith("_exchange")
+    )
+    growth_rate = {"measurement": 0.5, "uncertainty": 0}
+    random = np.random.RandomState(0)
+    for size in sizes:
+        proteomics = [
+            {"identifier": protein, "measurement": 10 ** exponent, "uncertainty": 0}
+            for protein, exponent in zip(
+                random.choice(proteins, size, replace=False),
+                random.uniform(-8, -3, size),
+            )
+        ]
+        print(f"{size} proteins:")
+        results = {}
+        for label, flexibilize in (
+            ("before", flexibilize_before),
+            ("after", flexibilize_after),
+            ("k=5", lambda *args: flexibilize_after(*args, k=5)),
+            ("k=20", lambda *args: flexibilize_after(*args, k=20)),
+        ):
+            # Start every run from a fresh copy, so that none is warm-started from the
+            # basis left by the previous one.
+            copy = model.copy()
+            copy.solver.configuration.timeout = timeout
+            start = time.time()
+            growth, removed = flexibilize(
+                copy, biomass_reaction, growth_rate, proteomics
+            )
+            duration = time.time() - start
+            if copy.solver.status != "optimal":
+                print(f"  {label:>6}: {duration:.2f}s, {copy.solver.status}")
+                continue
+            results[label] = removed
+            print(
+                f"  {label:>6}: {duration:.2f}s, {len(removed)} removed, "
+                f"growth {growth:.3f}"
+            )
+        if "before" in results and "after" in results:
+            assert results["before"] == results["after"]
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]), [int(size) for size in sys.argv[2:]] or SIZES)
@@ -0,0 +1,70 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the time of converting cobrapy models to reframed models.
+
+Each test model is converted the way `community.simulate` used to, by writing it to a
+temporary SBML file and loading that with `reframed.load_cbmodel`, and the way it does
+now, with `reframed_helpers.to_reframed`.
+
+Usage: python benchmarks/reframed_conversion.py [model ...]
+"""
+
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import cobra
+import reframed
+from cobra.io import read_sbml_model
+
+from simulations.modeling.reframed_helpers import to_reframed
+
+
+MODELS = ["e_coli_core", "iJO1366", "eciML1515"]
+REPEATS = 3
+
+
+def convert_sbml(model):
+    with tempfile.NamedTemporaryFile() as file_:
+        cobra.io.write_sbml_model(model, file_.name)
+        return reframed.load_cbmodel(file_.name, flavor="bigg")
+
+
+def measure(function, *args):
+    """Return the median duration in seconds of calling a function."""
+    durations = []
+    for _ in range(REPEATS):
+        start = time.time()
+        function(*args)
+        durations.append(time.time() - start)
+    return statistics.median(durations)
+
+
+def main(models):
+    logging.disable(logging.WARNING)
+    warnings.simplefilter("ignore")
+    for name in models:
+        model = read_sbml_model(f"tests/data/{name}.xml.gz")
+        print(f"{name} ({len(model.reactions)} reactions):")
+        for label, convert in (("sbml", convert_sbml), ("direct", to_reframed)):
+            print(f"  {label:>6}: {measure(convert, model):.2f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or MODELS)
@@ -0,0 +1,68 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare loading the salts mapping from `data/salts.json` and `data/salts.idx`.
+
+For both formats, the benchmark measures the time and the traced memory of loading
+the mapping, as done when importing `simulations.modeling.adapter`, and of looking up
+every salt id plus as many ids that are not salts.
+
+Usage: python benchmarks/salts_index.py
+"""
+
+import json
+import time
+import tracemalloc
+
+from simulations.modeling.salts import SaltsIndex
+
+
+def load_json():
+    with open("data/salts.json") as file_:
+        return json.load(file_)
+
+
+def load_index():
+    return SaltsIndex("data/salts.idx")
+
+
+def measure(load, keys):
+    tracemalloc.start()
+    start = time.time()
+    salts = load()
+    load_duration = time.time() - start
+    load_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.time()
+    for key in keys:
+        if key in salts:
+            salts[key]
+    lookup_duration = time.time() - start
+    return load_duration, load_memory / 1024 ** 2, lookup_duration
+
+
+def main():
+    keys = list(load_json())
+    keys += [f"CHEBI:{index}" for index in range(len(keys))]
+    for label, load in (("json", load_json), ("index", load_index)):
+        load_duration, load_memory, lookup_duration = measure(load, keys)
+        print(
+            f"{label:>5}: load {load_duration * 1000:.1f} ms, {load_memory:.2f} MiB; "
+            f"{len(keys)} lookups {lookup_duration * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
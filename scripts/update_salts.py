@@ -12,14 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import json
+import sys
 import xml.etree.ElementTree as ET
 from functools import partial
+from itertools import islice
 from multiprocessing import Pool
 from urllib import request
 
 import requests
 
+from simulations.modeling.salts import FIELDS, write_index
+
+
+# The number of "Term" sections of the chebi ontology parsed at a time.
+_TERMS_PER_BATCH = 20000
+
 
 class Chemical:
     """
@@ -28,7 +37,19 @@ class Chemical:
     ions_missing_smiles: A list of smiles ids that could not be mapped to ions
     metals: A list of metals this chemical can be split up to
     metals_missing_inchi: A list of inchi strings that could not be mapped to metals
+    smiles, inchi, inchi_formula: The structure of the chemical, if known
     """
+    __slots__ = (
+        "chebi",
+        "ions",
+        "ions_missing_smiles",
+        "metals",
+        "metals_missing_inchi",
+        "smiles",
+        "inchi",
+        "inchi_formula",
+    )
+
     def __init__(self, chebi):
         self.chebi = chebi
         self.ions = set()
@@ -46,28 +67,58 @@ class Chemical:
 
 
 def main():
-    print("Downloading chebi ontology (~125MB)...")
-    with request.urlopen("ftp://ftp.ebi.ac.uk/pub/databases/chebi/ontology/chebi.obo") as file_:
-        sections = file_.read().decode("iso-8859-1").split("\n\n")
-        print("Done, parsing and creating internal datastructures...")
-
-        # The following will be a complete list of all chemical instances parsed
-        # from the chebi ontology
-        all_chemicals = []
-
-        # Additionally, create maps for the various identifiers to their
-        # corresponding chemical instances
-        chebi = {}
-        smiles = {}
-        inchi = {}
-        inchi_formula = {}
-
-        # Parse each "Term" section of the obo file and generate the data
-        # structure described above.
-        for section in [s for s in sections if s.startswith("[Term]")]:
-            parse_obo_term_section(section, all_chemicals, chebi, smiles, inchi, inchi_formula)
-
-    map_ions(all_chemicals, smiles, inchi)
+    if "--index-only" in sys.argv:
+        # Only regenerate the binary index from the existing json mapping.
+        with open("data/salts.json") as file_:
+            write_salts_index(json.load(file_))
+        return
+
+    with Pool(processes=20) as pool:
+        if "--obo" in sys.argv:
+            path = sys.argv[sys.argv.index("--obo") + 1]
+            print(f"Reading chebi ontology from '{path}'...")
+            with open(path, encoding="iso-8859-1") as file_:
+                chemicals = read_chemicals(pool, file_)
+        else:
+            print("Downloading and parsing chebi ontology (~125MB)...")
+            with request.urlopen(
+                "ftp://ftp.ebi.ac.uk/pub/databases/chebi/ontology/chebi.obo"
+            ) as response:
+                chemicals = read_chemicals(
+                    pool, io.TextIOWrapper(response, encoding="iso-8859-1")
+                )
+        resolve_chemicals(pool, *chemicals)
+
+
+def read_chemicals(pool, file_):
+    """
+    Parse the chemicals of a chebi ontology while it is being read.
+
+    Returns a list of all chemical instances with a known structure parsed from the
+    ontology, and maps of the smiles ids, inchi strings and inchi formulas to the
+    corresponding chemical instances.
+    """
+    all_chemicals = []
+    smiles = {}
+    inchi = {}
+    inchi_formula = {}
+
+    # Parse the "Term" sections of the obo file in batches, so that only a batch of
+    # the file is kept in memory at a time, and add the chemicals to the maps.
+    terms = iter_obo_terms(file_)
+    while True:
+        sections = list(islice(terms, _TERMS_PER_BATCH))
+        if not sections:
+            break
+        for chemical in pool.imap(parse_obo_term_section, sections, chunksize=500):
+            if chemical is not None:
+                add_chemical(chemical, all_chemicals, smiles, inchi, inchi_formula)
+    print(f"  {len(all_chemicals)} chemicals with a known structure parsed")
+    return all_chemicals, smiles, inchi, inchi_formula
+
+
+def resolve_chemicals(pool, all_chemicals, smiles, inchi, inchi_formula):
+    map_ions(pool, all_chemicals, smiles, inchi)
     print(f"  {sum([len(c.ions) for c in all_chemicals])} ions successfully mapped")
     print(f"  {sum([len(c.ions_missing_smiles) for c in all_chemicals])} ions are still unknown")
 
@@ -75,57 +126,129 @@ def main():
     print(f"  {sum([len(c.metals) for c in all_chemicals])} metals mapped")
     print(f"  {sum([len(c.metals_missing_inchi) for c in all_chemicals])} metals are still unknown")
 
-    # TODO (Ali Kaafarani): Deal with nested structures. For example, CHEBI:86368 -> CHEBI:63041 -> CHEBI:29035 etc.
-    # Currently, only the topmost level will be mapped to its respective ions/metals.
+    salts = {c.chebi: c.to_json() for c in all_chemicals if c.ions or c.metals}
+    salts = resolve_nested_salts(pool, salts)
+    write_salts(salts)
+
 
+def write_salts(salts):
     # Create a suitable json format and persist it to a file. We're adding indentation and sorting keys
     # for readable diffs at later updates, at a small cost of file size.
-    salts = {c.chebi: c.to_json() for c in all_chemicals if c.ions or c.metals}
     with open("data/salts.json", "w") as file_:
         file_.write(json.dumps(salts, indent=2, sort_keys=True))
 
     print(f"Wrote {len(salts)} salt mappings to 'data/salts.json'")
+    write_salts_index(salts)
+
 
+def write_salts_index(salts):
+    # The service reads the mapping from this compact, memory-mapped index rather than
+    # from the json file, which is kept for readable diffs.
+    write_index(salts, "data/salts.idx")
+    print(f"Wrote {len(salts)} salt mappings to 'data/salts.idx'")
 
-def parse_obo_term_section(section, all_chemicals, chebi, smiles, inchi, inchi_formula):
+
+def resolve_nested_salts(pool, salts):
+    """
+    Decompose nested salts, e.g. CHEBI:86368 -> CHEBI:63041 -> CHEBI:29035, fully.
+
+    Ions and metals which are salts themselves are replaced by their own ions and
+    metals, recursively, so that the service finds the final decomposition of a salt in
+    a single lookup.
+    """
+    print("Resolving nested salts...")
+    resolved = {}
+    func = partial(resolve_nested_salt, salts)
+    for chebi, salt, cycles in pool.imap_unordered(func, salts, chunksize=100):
+        resolved[chebi] = salt
+        for cycle in cycles:
+            print(f"  warning: Not decomposing cyclic salts: {' -> '.join(cycle)}")
+    nested = sum(1 for chebi, salt in resolved.items() if salt != salts[chebi])
+    print(f"  {nested} nested salts decomposed")
+    return resolved
+
+
+def resolve_nested_salt(salts, chebi):
+    """
+    Return the given salt with nested salts decomposed, and the cycles encountered.
+
+    A salt which contains itself, directly or indirectly, is kept as is at the point
+    where the cycle closes.
+    """
+    # Use dicts as ordered sets to keep the original order of the identifiers.
+    resolved = {field: {} for field in FIELDS}
+    cycles = []
+
+    def visit(path):
+        salt = salts[path[-1]]
+        for field in FIELDS:
+            for value in salt[field]:
+                if field in ("ions", "metals") and value in salts:
+                    if value in path:
+                        cycles.append(path + [value])
+                    else:
+                        visit(path + [value])
+                        continue
+                resolved[field][value] = None
+
+    visit([chebi])
+    return chebi, {field: list(values) for field, values in resolved.items()}, cycles
+
+
+def iter_obo_terms(lines):
+    """Yield the "Term" sections of an obo file, given as an iterable of lines."""
+    section = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if line:
+            section.append(line)
+            continue
+        # Sections are separated by blank lines.
+        if section and section[0].startswith("[Term]"):
+            yield "\n".join(section)
+        section = []
+    if section and section[0].startswith("[Term]"):
+        yield "\n".join(section)
+
+
+def parse_obo_term_section(section):
+    """
+    Return the chemical described by the given "Term" section.
+
+    Chemicals without smiles or inchi can neither be split up nor be mapped to, so
+    None is returned for them.
+    """
+    chemical = None
     for line in section.split("\n"):
         if line.startswith("id: "):
             # The first line is the identifier; initialize a new chemical instance
-            id = line.split()[1]
-            chemical = Chemical(id)
-            all_chemicals.append(chemical)
-            chebi[id] = chemical
-        elif line.startswith("property_value"):
+            chemical = Chemical(line.split()[1])
+        elif line.startswith("property_value") and chemical is not None:
             if "smiles" in line:
                 # Set the smiles id on the chemical
-                id = line.split()[2].strip('"')
-                chemical.smiles = id
-
-                # Add the chemical to the smiles map
-                if id in smiles:
-                    smiles[id].append(chemical)
-                else:
-                    smiles[id] = [chemical]
+                chemical.smiles = line.split()[2].strip('"')
             elif "inchi " in line:  # The trailing space separates the inchi string from inchikey
                 # Set the inchi values on the chemical
                 id = line.split()[2].strip('"')
                 chemical.inchi = id
                 chemical.inchi_formula = id.split('/', 2)[1]
+    if chemical is None or not (hasattr(chemical, "smiles") or hasattr(chemical, "inchi")):
+        return None
+    return chemical
 
-                # Add the chemical to the inchi formula map
-                if chemical.inchi_formula in inchi_formula:
-                    inchi_formula[chemical.inchi_formula].append(chemical)
-                else:
-                    inchi_formula[chemical.inchi_formula] = [chemical]
 
-                # Add the chemical to the inchi map
-                if id in inchi:
-                    inchi[id].append(chemical)
-                else:
-                    inchi[id] = [chemical]
+def add_chemical(chemical, all_chemicals, smiles, inchi, inchi_formula):
+    all_chemicals.append(chemical)
+    if hasattr(chemical, "smiles"):
+        # Add the chemical to the smiles map
+        smiles.setdefault(chemical.smiles, []).append(chemical)
+    if hasattr(chemical, "inchi"):
+        # Add the chemical to the inchi formula and inchi maps
+        inchi_formula.setdefault(chemical.inchi_formula, []).append(chemical)
+        inchi.setdefault(chemical.inchi, []).append(chemical)
 
 
-def map_ions(all_chemicals, smiles, inchi):
+def map_ions(pool, all_chemicals, smiles, inchi):
     # Salts are recognized by a period in the smiles id, splitting up the chemicals.
     smiles_salts = [c for c in all_chemicals if hasattr(c, "smiles") and "." in c.smiles]
 
@@ -147,12 +270,11 @@ def map_ions(all_chemicals, smiles, inchi):
     # Map the remaining ions using inchi keys
     print(f"Mapping chemicals through inchi...")
     print(f"  Looking up {len([i for i, c in all_ions.items() if c is None])} inchi maps in chemspider API (may take a few minutes)...")
-    with Pool(processes=20) as pool:
-        func = partial(map_inchi, inchi)
-        missing_ions = [smiles_ion for smiles_ion, chebi_ids in all_ions.items() if chebi_ids is None]
-        for smiles_ion, chemicals in pool.imap_unordered(func, missing_ions, chunksize=100):
-            if chemicals is not None:
-                all_ions[smiles_ion] = chemicals
+    func = partial(map_inchi, inchi)
+    missing_ions = [smiles_ion for smiles_ion, chebi_ids in all_ions.items() if chebi_ids is None]
+    for smiles_ion, chemicals in pool.imap_unordered(func, missing_ions, chunksize=100):
+        if chemicals is not None:
+            all_ions[smiles_ion] = chemicals
     print()
 
     # Now assign the mapped ions back to the chemical objects
@@ -0,0 +1,228 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Provide general purpose caches and the caches of request results."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from simulations.app import app
+from simulations.metrics import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    A thread-safe least recently used cache with optional expiry and disk tier.
+
+    Lookups, misses and evictions are exported as metrics labelled with the name of the
+    cache.
+    """
+
+    def __init__(
+        self, name, maxsize, ttl=None, sizeof=None, on_evict=None, directory=None
+    ):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        name: str
+            A short name identifying the cache in metrics and logs.
+        maxsize: int
+            The maximum total size of the cached values. A maximum size of 0 disables
+            the cache.
+        ttl: float, optional
+            The number of seconds after which an entry expires. Entries never expire if
+            not given.
+        sizeof: callable, optional
+            A function returning the size of a value. Every value has size 1 if not
+            given, i.e., `maxsize` is the maximum number of entries.
+        on_evict: callable, optional
+            A function called with the key and value of each entry evicted due to size
+            or expiry.
+        directory: str, optional
+            A directory in which entries are also stored, and from which they are read
+            when missing in memory. Values must be bytes when this is used.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.size = 0
+        self._sizeof = sizeof or (lambda value: 1)
+        self._on_evict = on_evict
+        self._directory = directory
+        # Map keys to tuples of value, size and time of insertion.
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the value for the given key, or the default if not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2]):
+                self._evict(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._count(CACHE_HITS)
+                return entry[0]
+        value = self._read(key)
+        if value is None:
+            self._count(CACHE_MISSES)
+            return default
+        self._count(CACHE_HITS)
+        self._insert(key, value)
+        return value
+
+    def set(self, key, value):
+        """Cache the given value."""
+        if self.maxsize <= 0:
+            return
+        self._insert(key, value)
+        self._write(key, value)
+
+    def pop(self, key, default=None):
+        """Remove the entry for the given key and return its value."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.size -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        """Remove all entries from memory, without calling `on_evict`."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _insert(self, key, value):
+        size = self._sizeof(value)
+        if size > self.maxsize:
+            return
+        with self._lock:
+            self.pop(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self.size += size
+            # Evict entries from least to most recently used until within the limit.
+            while self.size > self.maxsize:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        value = self.pop(key)
+        logger.debug(f"Evicting entry {key} from the {self.name} cache")
+        CACHE_EVICTIONS.labels("model", os.environ["ENVIRONMENT"], self.name).inc()
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def _expired(self, timestamp):
+        return self.ttl is not None and time.monotonic() - timestamp > self.ttl
+
+    def _count(self, metric):
+        metric.labels("model", os.environ["ENVIRONMENT"], self.name).inc()
+
+    def _path(self, key):
+        return os.path.join(self._directory, str(key))
+
+    def _read(self, key):
+        """Return the value of the given key from the disk tier, if available."""
+        if not self._directory:
+            return None
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as file_:
+                return file_.read()
+        except OSError:
+            return None
+
+    def _write(self, key, value):
+        """Store the given value in the disk tier, if enabled."""
+        if not self._directory:
+            return
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            # Write to a temporary file first so that concurrent readers, possibly in
+            # other worker processes, never see a partially written file.
+            fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file_:
+                file_.write(value)
+            os.replace(temp_path, self._path(key))
+        except OSError as error:
+            logger.warning(f"Unable to write {self.name} cache entry {key}: {error}")
+
+
+# Keep the serialized responses of recent simulation requests, keyed by
+# `simulation_key`.
+SIMULATIONS = LRUCache(
+    "simulations",
+    app.config["SIMULATION_CACHE_SIZE"],
+    ttl=app.config["SIMULATION_CACHE_TTL"],
+    sizeof=len,
+    directory=app.config["SIMULATION_CACHE_DIR"],
+)
+
+
+def simulation_key(model_wrapper, **request):
+    """
+    Return a canonical digest of a simulation request on the given model.
+
+    The key includes the version of the model, so that results are not reused once the
+    model changes in the model warehouse. Object keys are sorted and whitespace is
+    normalized, but the order of the operations is preserved, because applying the same
+    operations in a different order may result in a different model.
+    """
+    document = json.dumps(
+        {"model_id": model_wrapper.id, "version": model_wrapper.version, **request},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+# Keep the results of applying recently used media, keyed by `medium_key`.
+MEDIA = LRUCache("media", app.config["MEDIUM_CACHE_SIZE"])
+
+
+def medium_key(model_wrapper, medium):
+    """
+    Return a canonical key for applying the given medium to the given model.
+
+    Only the identifiers and namespaces of the compounds are relevant, and neither their
+    order nor duplicates are.
+    """
+    compounds = sorted({(c["identifier"], c["namespace"]) for c in medium})
+    return (
+        model_wrapper.id,
+        model_wrapper.version,
+        model_wrapper.is_ec_model,
+        tuple(compounds),
+    )
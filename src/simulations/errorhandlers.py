@@ -26,13 +26,25 @@ from flask import jsonify
 from werkzeug.exceptions import HTTPException
 from werkzeug.routing import RoutingException
 
+from simulations.exceptions import Forbidden, ModelLoading, ModelNotFound, Unauthorized
+
 
 logger = logging.getLogger(__name__)
 
+# The status codes of the responses to errors retrieving a model from storage.
+MODEL_STORAGE_ERROR_CODES = {
+    Unauthorized: 401,
+    Forbidden: 403,
+    ModelNotFound: 404,
+    ModelLoading: 202,
+}
+
 
 def init_app(app):
     app.register_error_handler(422, handle_webargs_error)
     app.register_error_handler(HTTPException, handle_http_error)
+    for error in MODEL_STORAGE_ERROR_CODES:
+        app.register_error_handler(error, handle_model_storage_error)
     app.register_error_handler(Exception, handle_uncaught_error)
 
 
@@ -68,6 +80,21 @@ def handle_http_error(error):
         return response
 
 
+def handle_model_storage_error(error):
+    """
+    Handle errors retrieving a model from storage.
+
+    Respond with the corresponding status code and the error message. If the model is
+    being loaded in the background, the request is accepted, and the client is asked
+    to retry after the time given in the Retry-After header.
+    """
+    response = jsonify({"message": error.message})
+    response.status_code = MODEL_STORAGE_ERROR_CODES[type(error)]
+    if isinstance(error, ModelLoading):
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
 def handle_uncaught_error(error):
     """
     Handle any uncaught exceptions.
@@ -61,3 +61,11 @@ class Forbidden(ModelStorageError):
     """Thrown when not authorized for requesting a private model."""
 
     pass
+
+
+class ModelLoading(ModelStorageError):
+    """Thrown when requesting a model which is being loaded in the background."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,161 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Send outgoing requests to internal and external API services.
+
+Each service gets its own session with a pool of keep-alive connections, bounded
+retries with exponential backoff on connection errors and gateway errors, and default
+connect and read timeouts. All requests are timed in the `API_REQUESTS` histogram,
+streamed requests until their body has been read.
+"""
+
+import logging
+import os
+import threading
+from timeit import default_timer
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from simulations.app import app
+from simulations.metrics import API_REQUESTS
+
+
+logger = logging.getLogger(__name__)
+
+# Map the short name of each API service, as used in the `API_REQUESTS` labels, to the
+# configuration key of its base URL.
+SERVICES = {
+    "model-storage": "MODEL_STORAGE_API",
+    "ice": "ICE_API",
+    "id-mapper": "ID_MAPPER_API",
+}
+
+_SESSIONS = {}
+_SESSIONS_PID = None
+_SESSIONS_LOCK = threading.Lock()
+
+
+def session(api_name):
+    """Return the pooled session for the given API service."""
+    global _SESSIONS_PID
+    with _SESSIONS_LOCK:
+        # Connections must never be shared between processes, e.g. by gunicorn workers
+        # forked after preloading models, so start over in a new process.
+        if _SESSIONS_PID != os.getpid():
+            _SESSIONS.clear()
+            _SESSIONS_PID = os.getpid()
+        if api_name not in _SESSIONS:
+            logger.debug(f"Creating HTTP session for {api_name}")
+            retries = Retry(
+                total=app.config["HTTP_RETRIES"],
+                backoff_factor=app.config["HTTP_BACKOFF_FACTOR"],
+                status_forcelist=(502, 503, 504),
+                # Return the last response rather than raising when retries are
+                # exhausted, leaving the status code handling to the caller.
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_maxsize=app.config["HTTP_POOL_SIZE"], max_retries=retries
+            )
+            _SESSIONS[api_name] = requests.Session()
+            _SESSIONS[api_name].mount("http://", adapter)
+            _SESSIONS[api_name].mount("https://", adapter)
+        return _SESSIONS[api_name]
+
+
+def request(api_name, method, url, **kwargs):
+    """
+    Send a request to the given API service.
+
+    Parameters
+    ----------
+    api_name: str
+        The short name of the API service, one of the keys of `SERVICES`.
+    method: str
+        The HTTP method.
+    url: str
+        The full URL to request.
+    kwargs
+        Any further arguments to `requests.Session.request`. Unless a `timeout` is
+        given, the configured connect and read timeouts are applied.
+
+    Returns
+    -------
+    requests.Response
+    """
+    kwargs.setdefault(
+        "timeout", (app.config["HTTP_CONNECT_TIMEOUT"], app.config["HTTP_READ_TIMEOUT"])
+    )
+    histogram = API_REQUESTS.labels(
+        "model", os.environ["ENVIRONMENT"], api_name, app.config[SERVICES[api_name]]
+    )
+    if not kwargs.get("stream"):
+        with histogram.time():
+            return session(api_name).request(method, url, **kwargs)
+    start_time = default_timer()
+    try:
+        response = session(api_name).request(method, url, **kwargs)
+    except Exception:
+        histogram.observe(default_timer() - start_time)
+        raise
+    _time_body(response, histogram, start_time)
+    return response
+
+
+def _time_body(response, histogram, start_time):
+    """
+    Observe the duration of a streamed request once its body has been read.
+
+    The request returns as soon as the headers have arrived, so the time spent
+    downloading the body, e.g. a model, would otherwise not be measured. The duration
+    is observed once, when the body has been read or the response is closed, whichever
+    happens first.
+    """
+    observed = False
+    iter_content = response.iter_content
+    close = response.close
+
+    def observe():
+        nonlocal observed
+        if not observed:
+            observed = True
+            histogram.observe(default_timer() - start_time)
+
+    def timed_iter_content(*args, **kwargs):
+        try:
+            yield from iter_content(*args, **kwargs)
+        finally:
+            observe()
+
+    def timed_close():
+        observe()
+        close()
+
+    # `Response.content`, and thereby `Response.json`, also read the body through
+    # `iter_content`.
+    response.iter_content = timed_iter_content
+    response.close = timed_close
+
+
+def get(api_name, url, **kwargs):
+    """Send a GET request to the given API service."""
+    return request(api_name, "GET", url, **kwargs)
+
+
+def post(api_name, url, **kwargs):
+    """Send a POST request to the given API service."""
+    return request(api_name, "POST", url, **kwargs)
@@ -16,11 +16,9 @@ import json
 import logging
 import os
 
-import requests
-
+from simulations import http_client
 from simulations.app import app
 from simulations.exceptions import PartNotFound
-from simulations.metrics import API_REQUESTS
 from simulations.utils import Singleton
 
 
@@ -51,26 +49,22 @@ class ICE(metaclass=Singleton):
         Return reaction map information from the references field.
         """
         logger.info(f"Requesting genotype '{genotype}' from ICE")
-        with API_REQUESTS.labels(
-            "model", os.environ["ENVIRONMENT"], "ice", app.config["ICE_API"]
-        ).time():
-            response = requests.get(
-                f"{app.config['ICE_API']}/rest/parts/{genotype}",
-                headers=self._headers(),
-            )
+        response = http_client.get(
+            "ice",
+            f"{app.config['ICE_API']}/rest/parts/{genotype}",
+            headers=self._headers(),
+        )
 
         # In case of authentication failure, get a new session id and re-try the
         # request. The ICE documentation says nothing about access token expiry, so it's
         # not clear whether this can or will ever occur.
         if response.status_code in (401, 403):
             self._update_session_id()
-            with API_REQUESTS.labels(
-                "model", os.environ["ENVIRONMENT"], "ice", app.config["ICE_API"]
-            ).time():
-                response = requests.get(
-                    f"{app.config['ICE_API']}/rest/parts/{genotype}",
-                    headers=self._headers(),
-                )
+            response = http_client.get(
+                "ice",
+                f"{app.config['ICE_API']}/rest/parts/{genotype}",
+                headers=self._headers(),
+            )
 
         # If the part is not found, raise the corresponding exception
         if response.status_code == 404:
@@ -95,7 +89,8 @@ class ICE(metaclass=Singleton):
         Note that this usually takes ~10 seconds!
         """
         logger.info("Requesting session token from ICE")
-        response = requests.post(
+        response = http_client.post(
+            "ice",
             f"{app.config['ICE_API']}/rest/accesstokens",
             headers=self._headers(add_session_id=False),
             data=json.dumps(
@@ -14,12 +14,9 @@
 
 import json
 import logging
-import os
-
-import requests
 
+from simulations import http_client
 from simulations.app import app
-from simulations.metrics import API_REQUESTS
 from simulations.utils import log_time
 
 
@@ -43,9 +40,6 @@ def query_identifiers(object_ids, db_from, db_to):
         "query id mapper at %s with %s", app.config["ID_MAPPER_API"], str(query)
     )
     with log_time(operation=f"ID map request for ids: {object_ids}"):
-        with API_REQUESTS.labels(
-            "model", os.environ["ENVIRONMENT"], "id-mapper", app.config["ID_MAPPER_API"]
-        ).time():
-            return requests.post(
-                f"{app.config['ID_MAPPER_API']}/query", data=query
-            ).json()["ids"]
+        return http_client.post(
+            "id-mapper", f"{app.config['ID_MAPPER_API']}/query", data=query
+        ).json()["ids"]
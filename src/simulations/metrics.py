@@ -40,3 +40,77 @@ API_REQUESTS = prometheus_client.Histogram(
     "Time spent waiting for outgoing API request to internal or external services",
     ["service", "environment", "api_name", "endpoint"],
 )
+
+
+# CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS: Lookups and evictions in the in-memory
+# caches of the service
+# labels:
+#   service: The current service (always 'model')
+#   environment: The current runtime environment ('production' or 'staging')
+#   cache: A short name for the cache (e.g. 'models')
+CACHE_HITS = prometheus_client.Counter(
+    "decaf_cache_hits",
+    "Number of lookups served from an in-memory cache",
+    ["service", "environment", "cache"],
+)
+CACHE_MISSES = prometheus_client.Counter(
+    "decaf_cache_misses",
+    "Number of lookups not found in an in-memory cache",
+    ["service", "environment", "cache"],
+)
+CACHE_EVICTIONS = prometheus_client.Counter(
+    "decaf_cache_evictions",
+    "Number of entries evicted from an in-memory cache",
+    ["service", "environment", "cache"],
+)
+
+
+# MODEL_LOAD_TIME: Time spent retrieving and deserializing a model from the warehouse
+# labels:
+#   service: The current service (always 'model')
+#   environment: The current runtime environment ('production' or 'staging')
+MODEL_LOAD_TIME = prometheus_client.Histogram(
+    "decaf_model_load_duration_seconds",
+    "Time spent retrieving and deserializing a model from the model warehouse",
+    ["service", "environment"],
+)
+
+
+# PRELOADED_MODELS: Progress of preloading public models on startup
+# labels:
+#   service: The current service (always 'model')
+#   environment: The current runtime environment ('production' or 'staging')
+#   status: 'total' for the number of models to preload, 'done' for the number of
+#           models preloaded so far
+PRELOADED_MODELS = prometheus_client.Gauge(
+    "decaf_preloaded_models",
+    "Progress of preloading public models on startup",
+    ["service", "environment", "status"],
+    multiprocess_mode="max",
+)
+
+
+# FVA_REACTION_TIME: Time spent per reaction in flux variability analysis, averaged
+# over the reactions of each analysis
+# labels:
+#   service: The current service (always 'model')
+#   environment: The current runtime environment ('production' or 'staging')
+FVA_REACTION_TIME = prometheus_client.Histogram(
+    "decaf_fva_reaction_duration_seconds",
+    "Time spent per reaction in flux variability analysis",
+    ["service", "environment"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+# FLUX_ADJUSTMENT_TIME: Time spent solving the problem minimizing the distance to
+# measured fluxes
+# labels:
+#   service: The current service (always 'model')
+#   environment: The current runtime environment ('production' or 'staging')
+#   formulation: The kind of the problem, 'lp', 'qp', 'milp' or 'miqp'
+FLUX_ADJUSTMENT_TIME = prometheus_client.Histogram(
+    "decaf_flux_adjustment_duration_seconds",
+    "Time spent minimizing the distance to measured fluxes",
+    ["service", "environment", "formulation"],
+)
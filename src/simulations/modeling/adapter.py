@@ -12,8 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 import logging
+import os
 from collections import namedtuple
 
 from cobra import Configuration, Metabolite, Reaction
@@ -23,19 +23,28 @@ from cobra.medium.boundary_types import find_external_compartment
 from simulations.exceptions import CompartmentNotFound, MetaboliteNotFound, PartNotFound
 from simulations.ice_client import ICE
 from simulations.modeling.cobra_helpers import (
+    find_genes,
     find_metabolite,
     get_exchange_reaction,
+    get_exchanges,
+    index_proteins,
+    invalidate_indices,
     parse_bigg_compartment,
+    set_bounds,
 )
 from simulations.modeling.driven import flexibilize_proteomics, minimize_distance
 from simulations.modeling.gnomic_helpers import feature_id
+from simulations.modeling.salts import SaltsIndex
 
 
 logger = logging.getLogger(__name__)
 ice = ICE()
 
-with open("data/salts.json") as file_:
-    SALTS = json.load(file_)
+# The salts dissociation mapping, generated by `scripts/update_salts.py`. It is read
+# lazily from a memory-mapped index file shared between all workers.
+SALTS = SaltsIndex(
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "salts.idx")
+)
 
 
 def apply_medium(model, is_ec_model, medium):
@@ -126,6 +135,15 @@ def apply_medium(model, is_ec_model, medium):
         # immediately return the error.
         return operations, warnings, errors
 
+    # Take a single snapshot of the current medium rather than evaluating the
+    # `model.medium` property, which walks all exchange reactions, for every compound.
+    exchanges = get_exchanges(model)
+    current_medium = {
+        reaction.id: _active_bound(reaction)
+        for reaction in exchanges
+        if _is_active(reaction)
+    }
+
     # Create a map of exchange reactions and corresponding fluxes to apply to
     # the medium.
     medium_mapping = {}
@@ -148,8 +166,8 @@ def apply_medium(model, is_ec_model, medium):
 
             # If someone already figured out the uptake rate for the compound, it's
             # likely more accurate than our assumptions, so keep it
-            if exchange_reaction.id in model.medium:
-                medium_mapping[exchange_reaction.id] = model.medium[
+            if exchange_reaction.id in current_medium:
+                medium_mapping[exchange_reaction.id] = current_medium[
                     exchange_reaction.id
                 ]
                 continue
@@ -170,25 +188,55 @@ def apply_medium(model, is_ec_model, medium):
             else:
                 medium_mapping[exchange_reaction.id] = 1000
 
-    # Apply the medium to the model, letting cobrapy deal with figuring out the correct
-    # bounds to change
-    model.medium = medium_mapping
-
-    # Add all exchange reactions to operations, to make sure any changed bounds is
-    # properly updated
-    for reaction in model.exchanges:
-        operations.append(
-            {
-                "operation": "modify",
-                "type": "reaction",
-                "id": reaction.id,
-                "data": reaction_to_dict(reaction),
-            }
-        )
+    # Apply the medium to the model the way `model.medium` would, setting the bound in
+    # the direction of uptake and closing the uptake of all other exchange reactions
+    # which permit uptake. Only the bounds that actually change are set, and only those
+    # are returned as operations.
+    bounds = {}
+    for reaction in exchanges:
+        if reaction.id in medium_mapping:
+            bound = medium_mapping[reaction.id]
+        elif _is_active(reaction):
+            bound = 0
+        else:
+            continue
+        lower_bound, upper_bound = reaction.bounds
+        # Like the `lower_bound` and `upper_bound` setters, move the opposite bound if
+        # necessary.
+        if reaction.reactants:
+            if lower_bound != -bound:
+                bounds[reaction] = -bound, max(upper_bound, -bound)
+        elif reaction.products and upper_bound != bound:
+            bounds[reaction] = min(lower_bound, bound), bound
+    set_bounds(model, bounds)
+    operations.extend(
+        {
+            "operation": "modify",
+            "type": "reaction",
+            "id": reaction.id,
+            "data": reaction_to_dict(reaction),
+        }
+        for reaction in bounds
+    )
 
     return operations, warnings, errors
 
 
+def _is_active(reaction):
+    """Return whether the exchange reaction permits uptake of its metabolite."""
+    return (bool(reaction.products) and reaction.upper_bound > 0) or (
+        bool(reaction.reactants) and reaction.lower_bound < 0
+    )
+
+
+def _active_bound(reaction):
+    """Return the uptake bound of the exchange reaction, as in `model.medium`."""
+    if reaction.reactants:
+        return -reaction.lower_bound
+    elif reaction.products:
+        return reaction.upper_bound
+
+
 def apply_genotype(model, genotype_changes):
     """
     Apply genotype changes to a metabolic model.
@@ -220,20 +268,14 @@ def apply_genotype(model, genotype_changes):
     # Apply feature operations
     for feature in genotype_changes.removed_features:
         feature_identifer = feature_id(feature)
-        feature_lower = feature_identifer.lower()
         # Perform gene knockout. Use feature name as gene name
         try:
             # Some genotype descriptions wrongly use the protein names rather
             # than the gene names, for example, AdhE instead of adhE.
             # We want to be forgiving here and only compare lower case names.
-            def compare_feature(gene):
-                return (
-                    gene.id == feature_identifer or gene.name.lower() == feature_lower
-                )
-
             # We pick the first result. A fuzzy search on the name would be
             # useful in future.
-            gene = model.genes.query(compare_feature)[0]
+            gene = find_genes(model, feature_identifer, ignore_case=True)[0]
             gene.knock_out()
             operations.append({"operation": "knockout", "type": "gene", "id": gene.id})
         except IndexError:
@@ -245,13 +287,8 @@ def apply_genotype(model, genotype_changes):
 
     for feature in genotype_changes.added_features:
         feature_identifer = feature_id(feature)
-        feature_lower = feature_identifer.lower()
         # Perform gene insertion unless the gene already exists in the model.
-
-        def compare_feature(gene):
-            return gene.id == feature_identifer or gene.name.lower() == feature_lower
-
-        if model.genes.query(compare_feature):
+        if find_genes(model, feature_identifer, ignore_case=True):
             logger.info(
                 f"Not adding gene '{feature_identifer}', "
                 f"it already exists in the model."
@@ -390,6 +427,8 @@ def apply_genotype(model, genotype_changes):
                     }
                 )
 
+    # Reactions and metabolites may have been added or removed above.
+    invalidate_indices(model)
     return operations, warnings, errors
 
 
@@ -509,36 +548,37 @@ def apply_measurements(
         warnings.append(warning)
         logger.warning(warning)
 
-    for measure in proteomics:
-        if is_ec_model:
-            try:
-                reaction = model.reactions.get_by_id(
-                    f"prot_{measure['identifier']}_exchange"
-                )
-            except KeyError:
+    if proteomics and is_ec_model:
+        proteins = index_proteins(model)
+        positions = proteins.positions([m["identifier"] for m in proteomics])
+        upper_bounds = []
+        for measure, position in zip(proteomics, positions):
+            if position < 0:
                 warning = f"Cannot find protein '{measure['identifier']}' in the model"
                 warnings.append(warning)
                 logger.warning(warning)
             else:
                 # measurement only modifies the upper bound (enzymes can be unsaturated)
                 lb, ub = bounds(measure["measurement"], measure["uncertainty"])
-                reaction.bounds = 0, ub
-                operations.append(
-                    {
-                        "operation": "modify",
-                        "type": "reaction",
-                        "id": reaction.id,
-                        "data": reaction_to_dict(reaction),
-                    }
-                )
-        else:
-            warning = (
-                f"Cannot apply proteomics measurements for "
-                f"non enzyme-constrained model {model.id}"
+                upper_bounds.append(ub)
+        found = positions[positions >= 0]
+        proteins.limit(model, found, upper_bounds)
+        for reaction in dict.fromkeys(proteins.exchanges(model, found)):
+            operations.append(
+                {
+                    "operation": "modify",
+                    "type": "reaction",
+                    "id": reaction.id,
+                    "data": reaction_to_dict(reaction),
+                }
             )
-            warnings.append(warning)
-            logger.warning(warning)
-            break
+    elif proteomics:
+        warning = (
+            f"Cannot apply proteomics measurements for "
+            f"non enzyme-constrained model {model.id}"
+        )
+        warnings.append(warning)
+        logger.warning(warning)
 
     for rate in uptake_secretion_rates:
         try:
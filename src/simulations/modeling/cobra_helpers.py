@@ -13,6 +13,14 @@
 # limitations under the License.
 
 import logging
+import re
+import weakref
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from functools import partial
+
+import numpy as np
+from cobra.util.context import get_context
 
 from simulations.exceptions import (
     CompartmentNotFound,
@@ -23,6 +31,24 @@ from simulations.exceptions import (
 
 logger = logging.getLogger(__name__)
 
+# The exchange reactions of a metabolite, by direction. See `get_exchange_reaction`.
+ExchangeReactions = namedtuple(
+    "ExchangeReactions", ["all", "consumption", "production"]
+)
+
+# The ids of the exchange reactions supplying the proteins of enzyme-constrained models,
+# capturing the UniProt id of the protein.
+PROTEIN_EXCHANGE_PATTERN = re.compile(r"^prot_(.*)_exchange$")
+
+# Lookup indices of each model, built lazily by `_get_index`. The model is weakly
+# referenced, and the indices only hold identifiers rather than items referencing the
+# model, so that its indices are discarded together with it.
+_INDICES = weakref.WeakKeyDictionary()
+
+# The model contexts entered by the active checkpoints of each model, innermost last.
+# See `checkpoint`.
+_CHECKPOINTS = weakref.WeakKeyDictionary()
+
 
 def find_reaction(model, id, namespace):
     """
@@ -52,10 +78,10 @@ def find_reaction(model, id, namespace):
         If no reactions are found for the given parameters.
     """
 
-    def query_fun(reaction):
-        return _query_item(reaction, id, namespace)
-
-    reactions = model.reactions.query(query_fun)
+    index = _get_index(model, "reactions", _build_annotation_index)
+    reactions = index.find(
+        model.reactions, [(None, id.lower()), (namespace.lower(), id.lower())]
+    )
     if len(reactions) == 0:
         raise ReactionNotFound(
             f"Could not find reaction {id} in namespace {namespace} for "
@@ -100,20 +126,19 @@ def find_metabolite(model, id, namespace, compartment):
         If no metabolites are found for the given parameters.
     """
 
-    def query_fun(metabolite):
-        if metabolite.compartment != compartment:
-            return False
-
-        result = _query_item(metabolite, id, namespace)
-        if result:
-            return result
-
-        # If the original query fails, retry with the compartment id appended
-        # to the identifier (a regular convenation with BiGG metabolites, but
-        # may also be the case in other namespaces).
-        return _query_item(metabolite, f"{id}_{compartment}", namespace)
-
-    metabolites = model.metabolites.query(query_fun)
+    index = _get_index(model, "metabolites", _build_annotation_index)
+    metabolites = index.find(
+        model.metabolites,
+        [
+            (compartment, None, id.lower()),
+            (compartment, namespace.lower(), id.lower()),
+            # If the original query fails, retry with the compartment id appended
+            # to the identifier (a regular convenation with BiGG metabolites, but
+            # may also be the case in other namespaces).
+            (compartment, None, f"{id}_{compartment}".lower()),
+            (compartment, namespace.lower(), f"{id}_{compartment}".lower()),
+        ],
+    )
     if len(metabolites) == 0:
         raise MetaboliteNotFound(
             f"Could not find metabolite {id} or {id}_{compartment} in "
@@ -126,43 +151,340 @@ def find_metabolite(model, id, namespace, compartment):
         return metabolites[0]
 
 
-def _query_item(item, query_id, query_namespace):
+def find_genes(model, id, ignore_case=False):
     """
-    Check if the given cobra collection item matches the query arguments.
+    Search a model for the genes with a given identifier or name.
 
     Parameters
     ----------
-    item: cobra.Reaction or cobra.Metabolite
-    query_id: str
-        The identifier to compare. The comparison is made case insensitively.
-    query_namespace: str
-        The miriam namespace identifier in which the given metabolite is
-        registered. See https://www.ebi.ac.uk/miriam/main/collections
-        The comparison is made case insensitively.
+    model: cobra.Model
+    id: str
+        The identifier or name of the genes to find.
+    ignore_case: bool (default False)
+        Whether to compare names case insensitively. Identifiers are always compared
+        case sensitively.
 
     Returns
     -------
-    bool
-        True if the given id exists in the default namespace, or in the model
-        annotations by the queried namespace, otherwise False.
-    """
-    # Try the default identifiers (without confirming the namespace)
-    if query_id.lower() == item.id.lower():
-        return True
-
-    # Otherwise, try to find a case insensitive match for the namespace key
-    for namespace in item.annotation:
-        if query_namespace.lower() == namespace.lower():
-            annotation = item.annotation[namespace]
-            # Compare the identifier case insensitively as well
+    list(cobra.Gene)
+        The matching genes, in the order of the model.
+    """
+    if ignore_case:
+        keys = [("id", id), ("name_lower", id.lower())]
+    else:
+        keys = [("id", id), ("name", id)]
+    return index_genes(model).find(model.genes, keys)
+
+
+def index_genes(model):
+    """
+    Return the gene index of the model, building it if necessary.
+
+    Call this after loading a model, so that the index does not need to be built while
+    handling requests.
+    """
+    return _get_index(model, "genes", _build_gene_index)
+
+
+class _Index:
+    """
+    Map keys to the identifiers of the model items they identify.
+
+    Items are returned in the order of the model, so that lookups return the same
+    results as querying the items one by one.
+    """
+
+    def __init__(self, items):
+        self._ordinals = {item.id: ordinal for ordinal, item in enumerate(items)}
+        self._ids = defaultdict(list)
+
+    def add(self, key, item):
+        if item.id not in self._ids[key]:
+            self._ids[key].append(item.id)
+
+    def find(self, items, keys):
+        """Return the items of the given list identified by any of the given keys."""
+        ids = {id for key in keys for id in self._ids.get(key, ())}
+        ids = sorted(ids, key=self._ordinals.__getitem__)
+        return [items.get_by_id(id) for id in ids]
+
+
+def _build_annotation_index(model, attribute):
+    """
+    Index reactions or metabolites by their lowercased identifiers and annotations.
+
+    Reactions are keyed by (namespace, identifier) tuples, where the namespace of the
+    item's own identifier is None. Metabolites are keyed by (compartment, namespace,
+    identifier) tuples.
+    """
+    items = getattr(model, attribute)
+    index = _Index(items)
+    for item in items:
+        prefix = (item.compartment,) if attribute == "metabolites" else ()
+        index.add(prefix + (None, item.id.lower()), item)
+        for namespace, annotation in item.annotation.items():
             # Annotations may contain a single id or a list of ids
-            if isinstance(annotation, list):
-                if query_id.lower() in [i.lower() for i in annotation]:
-                    return True
-            else:
-                if query_id.lower() == annotation.lower():
-                    return True
-    return False
+            if not isinstance(annotation, list):
+                annotation = [annotation]
+            for identifier in annotation:
+                if isinstance(identifier, str):
+                    index.add(prefix + (namespace.lower(), identifier.lower()), item)
+    return index
+
+
+def _build_gene_index(model, attribute):
+    """Index genes by their identifiers, names and lowercased names."""
+    index = _Index(model.genes)
+    for gene in model.genes:
+        index.add(("id", gene.id), gene)
+        if gene.name:
+            index.add(("name", gene.name), gene)
+            index.add(("name_lower", gene.name.lower()), gene)
+    return index
+
+
+def index_proteins(model):
+    """
+    Return the protein index of an enzyme-constrained model, building it if necessary.
+
+    Call this after loading a model, so that the index does not need to be built while
+    handling requests.
+    """
+    return _get_index(model, "proteins", _build_protein_index)
+
+
+class ProteinIndex:
+    """
+    The proteins of an enzyme-constrained model.
+
+    Proteins are identified by their UniProt ids and supplied by exchange reactions
+    with ids of the form `prot_<UniProt id>_exchange`, whose single metabolite is the
+    protein. The proteins are held in arrays, in the order of their metabolites in the
+    model.
+
+    Attributes
+    ----------
+    ids: list(str)
+        The UniProt ids of the proteins.
+    metabolite_ids: numpy.ndarray
+        The ids of the protein metabolites.
+    exchange_ids: numpy.ndarray
+        The ids of the exchange reactions supplying the proteins.
+    """
+
+    def __init__(self, ids, metabolite_ids, exchange_ids):
+        self.ids = list(ids)
+        self.metabolite_ids = np.array(metabolite_ids, dtype=object)
+        self.exchange_ids = np.array(exchange_ids, dtype=object)
+        self._positions = {id: position for position, id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return id in self._positions
+
+    def positions(self, ids):
+        """Return the positions of the given proteins, or -1 for unknown ones."""
+        return np.array([self._positions.get(id, -1) for id in ids], dtype=int)
+
+    def exchanges(self, model, positions):
+        """Return the exchange reactions supplying the given proteins."""
+        return [model.reactions.get_by_id(id) for id in self.exchange_ids[positions]]
+
+    def limit(self, model, positions, upper_bounds):
+        """
+        Limit the supply of the given proteins to the given abundances at once.
+
+        Only the upper bounds are set, as enzymes can be unsaturated. See `set_bounds`.
+
+        Parameters
+        ----------
+        model: cobra.Model
+        positions: numpy.ndarray
+            The positions of the proteins in the index.
+        upper_bounds: numpy.ndarray
+            The abundances of the proteins in mmol / gDW.
+        """
+        exchanges = self.exchanges(model, positions)
+        set_bounds(model, {r: (0, ub) for r, ub in zip(exchanges, upper_bounds)})
+
+
+def _build_protein_index(model, attribute):
+    """Index the proteins of an enzyme-constrained model by their UniProt ids."""
+    proteins = []
+    for reaction in model.reactions:
+        match = PROTEIN_EXCHANGE_PATTERN.match(reaction.id)
+        if match is not None and len(reaction.metabolites) == 1:
+            metabolite = next(iter(reaction.metabolites))
+            proteins.append(
+                (model.metabolites.index(metabolite), match.group(1), reaction.id)
+            )
+    proteins.sort(key=lambda protein: protein[0])
+    return ProteinIndex(
+        [id for _, id, _ in proteins],
+        [model.metabolites[position].id for position, _, _ in proteins],
+        [reaction_id for _, _, reaction_id in proteins],
+    )
+
+
+def _get_index(model, attribute, build):
+    """
+    Return the index of the given model attribute, building it if necessary.
+
+    The index is rebuilt if reactions, metabolites or genes have been added to or
+    removed from the model since it was built, but callers that modify the model should
+    still call `invalidate_indices` explicitly.
+    """
+    indices = _INDICES.setdefault(model, {})
+    size = (len(model.reactions), len(model.metabolites), len(model.genes))
+    if indices.get("size") != size:
+        indices.clear()
+        indices["size"] = size
+    if attribute not in indices:
+        logger.debug(f"Building {attribute} index of model {model.id}")
+        indices[attribute] = build(model, attribute)
+    return indices[attribute]
+
+
+def _build_exchange_index(model, attribute):
+    """
+    Map the ids of metabolites to the ids of their exchange reactions.
+
+    Consumption exchange reactions have products (formula --> X), and production
+    exchange reactions have reactants (formula X -->). Reversible exchange reactions
+    in regular models have reactants and are thus classified for production.
+    """
+    index = {}
+    for reaction in get_exchanges(model):
+        for metabolite in reaction.metabolites:
+            exchange_reactions = index.setdefault(
+                metabolite.id, ExchangeReactions([], [], [])
+            )
+            exchange_reactions.all.append(reaction.id)
+            if reaction.products:
+                exchange_reactions.consumption.append(reaction.id)
+            if reaction.reactants:
+                exchange_reactions.production.append(reaction.id)
+    return index
+
+
+def invalidate_indices(model):
+    """
+    Discard the lookup indices of the given model after modifying it.
+
+    If the model is modified within a context, the indices are discarded again when the
+    context exits and the modifications are reverted.
+    """
+    _INDICES.pop(model, None)
+    context = get_context(model)
+    if context is not None:
+        context(partial(_INDICES.pop, model, None))
+
+
+def set_bounds(model, bounds):
+    """
+    Set the bounds of many reactions of a model at once.
+
+    This is equivalent to setting the `bounds` of every reaction, but reactions whose
+    bounds don't change are skipped. Within a model context, a single entry is recorded
+    which restores the previous bounds of all changed reactions, rather than one entry
+    per reaction. Directly within a `checkpoint`, nothing is recorded, as the
+    checkpoint restores all bounds on exit.
+
+    Parameters
+    ----------
+    model: cobra.Model
+    bounds: dict
+        A map of reactions of the model to tuples of their new lower and upper bounds.
+
+    Raises
+    ------
+    ValueError
+        If a lower bound is greater than the corresponding upper bound. No bounds are
+        changed in that case.
+    """
+    reactions = [r for r, value in bounds.items() if r.bounds != tuple(value)]
+    if not reactions:
+        return
+    for reaction in reactions:
+        lower, upper = bounds[reaction]
+        if lower > upper:
+            raise ValueError(
+                f"The lower bound of reaction {reaction.id} must be less than or equal "
+                f"to the upper bound ({lower} <= {upper})."
+            )
+    lower_bounds = [reaction.lower_bound for reaction in reactions]
+    upper_bounds = [reaction.upper_bound for reaction in reactions]
+    _set_bounds(
+        reactions,
+        [bounds[reaction][0] for reaction in reactions],
+        [bounds[reaction][1] for reaction in reactions],
+    )
+    context = get_context(model)
+    checkpoints = _CHECKPOINTS.get(model)
+    if context is not None and not (checkpoints and checkpoints[-1] is context):
+        context(partial(_set_bounds, reactions, lower_bounds, upper_bounds))
+
+
+def _set_bounds(reactions, lower_bounds, upper_bounds):
+    # Set the bounds directly, because the `bounds` setter records an entry in the
+    # model context.
+    for reaction, lower, upper in zip(reactions, lower_bounds, upper_bounds):
+        reaction._lower_bound = lower
+        reaction._upper_bound = upper
+        reaction.update_variable_bounds()
+
+
+@contextmanager
+def checkpoint(model):
+    """
+    Undo all modifications of the model made within this context on exit.
+
+    This enters a model context, which reverts structural changes, the objective, gene
+    states and bounds set with setters. In addition, the bounds of all reactions are
+    saved in arrays on entry. Bounds set with `set_bounds` directly within this
+    context are not recorded in the model context. Instead, after the model context
+    has been unwound, the bounds of all reactions that differ from the saved ones are
+    restored at once.
+
+    Parameters
+    ----------
+    model: cobra.Model
+
+    Yields
+    ------
+    cobra.Model
+        The given model.
+    """
+    reactions = list(model.reactions)
+    bounds = _get_bounds(reactions)
+    try:
+        with model:
+            checkpoints = _CHECKPOINTS.setdefault(model, [])
+            checkpoints.append(get_context(model))
+            try:
+                yield model
+            finally:
+                checkpoints.pop()
+    finally:
+        # Reactions removed within the context have been added back by now, and those
+        # added have been removed again. Since the saved bounds are those on entry, it
+        # doesn't matter in which order the model context restored the others.
+        changed = np.flatnonzero((_get_bounds(reactions) != bounds).any(axis=1))
+        _set_bounds(
+            [reactions[index] for index in changed],
+            bounds[changed, 0].tolist(),
+            bounds[changed, 1].tolist(),
+        )
+
+
+def _get_bounds(reactions):
+    """Return the lower and upper bounds of the given reactions as an array."""
+    bounds = np.empty((len(reactions), 2))
+    bounds[:, 0] = [reaction._lower_bound for reaction in reactions]
+    bounds[:, 1] = [reaction._upper_bound for reaction in reactions]
+    return bounds
 
 
 def parse_bigg_compartment(metabolite_id, model):
@@ -207,6 +529,21 @@ def parse_bigg_compartment(metabolite_id, model):
     return metabolite_id, compartment_id
 
 
+def get_exchanges(model):
+    """
+    Return the exchange reactions of the model.
+
+    This is equivalent to `model.exchanges`, but the exchange reactions are only
+    detected once and kept in the model's indices.
+    """
+    ids = _get_index(
+        model,
+        "exchange_reactions",
+        lambda model, attribute: [reaction.id for reaction in model.exchanges],
+    )
+    return [model.reactions.get_by_id(id) for id in ids]
+
+
 def get_exchange_reaction(metabolite, is_ec_model=False, consumption=None):
     """
     Return a metabolite's exchange reaction.
@@ -243,22 +580,23 @@ def get_exchange_reaction(metabolite, is_ec_model=False, consumption=None):
         reaction.
     """
     model = metabolite.model
-    exchange_reactions = metabolite.reactions.intersection(model.exchanges)
+    index = _get_index(model, "exchanges", _build_exchange_index)
+    exchange_reactions = index.get(metabolite.id, ExchangeReactions([], [], []))
     if is_ec_model:
         # For ecModels, as described above we expect two exchange reactions, so
-        # filter the list based on whether the caller desires consumption or
-        # secretion.
+        # pick the ones for consumption or secretion as desired by the caller.
         if type(consumption) != bool:
             raise TypeError("Consumption must be specified for ecModels")
-        exchange_reactions = [
-            reaction
-            for reaction in exchange_reactions
-            if (reaction.products and consumption)
-            or (reaction.reactants and not consumption)
-        ]
+        exchange_reactions = (
+            exchange_reactions.consumption
+            if consumption
+            else exchange_reactions.production
+        )
+    else:
+        exchange_reactions = exchange_reactions.all
     if len(exchange_reactions) != 1:
         raise ValueError(
             f"The given metabolite has {len(exchange_reactions)} exchange "
             "reactions; expected 1"
         )
-    return next(iter(exchange_reactions))
+    return model.reactions.get_by_id(exchange_reactions[0])
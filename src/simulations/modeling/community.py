@@ -13,15 +13,14 @@
 # limitations under the License.
 
 import logging
-import tempfile
 import warnings
 
-import cobra
 import reframed
 
 from simulations.modeling.reframed_helpers import (
     create_metabolite_id2name_mapping,
     generate_transactions,
+    to_reframed,
 )
 
 
@@ -50,16 +49,7 @@ def simulate(wrappers, medium, method):
 
     with warnings.catch_warnings(record=True) as reframed_warnings:
         logger.debug("Converting cobrapy models to reframed models")
-        rf_models = []
-        for model in [wrapper.model for wrapper in wrappers]:
-            # The most funcational approach (albeit slow) seems to be to write and
-            # reload SBML. reframed's cobrapy integration is currently pretty
-            # minimal.
-            with tempfile.NamedTemporaryFile() as file_:
-                cobra.io.write_sbml_model(model, file_.name)
-                # TODO: Consider accepting the flavor argument as a parameter
-                # instead of always assuming BiGG.
-                rf_models.append(reframed.load_cbmodel(file_.name, flavor="bigg"))
+        rf_models = [to_reframed(wrapper.model) for wrapper in wrappers]
 
         logger.debug("Merging individual models to a community")
         community = reframed.Community("community", rf_models)
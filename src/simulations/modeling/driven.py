@@ -12,18 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import logging
+import os
+import time
+import weakref
+from functools import partial
 
 import numpy as np
 import pandas as pd
+from cobra.util.context import get_context
 from optlang.symbolics import Zero
 
+from simulations.app import app
+from simulations.cache import LRUCache
 from simulations.exceptions import MetaboliteNotFound
-from simulations.modeling.cobra_helpers import find_metabolite, get_exchange_reaction
+from simulations.metrics import FLUX_ADJUSTMENT_TIME
+from simulations.modeling.cobra_helpers import (
+    find_metabolite,
+    get_exchange_reaction,
+    index_proteins,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# The fitting problems of each model, see `_get_fitting_problem`. The model is weakly
+# referenced, and the problems don't reference it, so that they are discarded together
+# with it.
+_FITTING_PROBLEMS = weakref.WeakKeyDictionary()
+
 
 """This module may one day be replaced with http://driven.bio/"""
 
@@ -67,7 +85,7 @@ def minimize_distance(model, biomass_reaction, growth_rate, fluxomics):
 
 
 def adjust_fluxes2model(
-    model, observations, uncertainties=None, linear=True, big_m=1e05
+    model, observations, uncertainties=None, linear=True, big_m=1e05, formulation=None
 ):
     """
     Minimize the distance to observed fluxes accounting for multiple directions.
@@ -76,6 +94,13 @@ def adjust_fluxes2model(
     minimizing the distance to the observations, is weighted by the inverse
     of the uncertainties.
 
+    The direction of an observed flux is not necessarily known, so the distance to
+    either the observed flux or its negation is minimized, chosen by a binary variable
+    per observation. The binary variable is unnecessary if the reaction can only carry
+    flux in one direction, or if the observed flux is zero. Unless all directions are
+    known, the problem is thus a mixed integer problem, whose solving time grows
+    exponentially with the number of observations.
+
     Parameters
     ----------
     model : cobra.Model
@@ -91,12 +116,20 @@ def adjust_fluxes2model(
     big_m : float, optional
         Big M method value. This is used to resolve greater than inequalities
         and should be an adequately large number.
+    formulation : {None, "milp", "lp"}, optional
+        How to account for the unknown directions of observed fluxes. "milp" adds a
+        binary variable for every observation and "lp" assumes that the signs of the
+        observations are correct, unless contradicted by the bounds of the reaction.
+        By default, binary variables are only added where the direction is not known,
+        so that a linear (or quadratic) problem is solved whenever possible.
 
     Returns
     -------
     cobra.Solution
 
     """
+    if formulation not in (None, "milp", "lp"):
+        raise ValueError(f"Unknown formulation '{formulation}'")
     flux_col = "flux"
     weight_col = "weight"
     if uncertainties is None:
@@ -112,61 +145,216 @@ def adjust_fluxes2model(
         | (data[weight_col] == 0),
         weight_col,
     ] = 1
-    prob = model.problem
-    to_add = list()
-    new_obj = Zero
+    formulations = []
+    targets = {}
+    weights = {}
+    for rxn_id, flux, weight in data[[flux_col, weight_col]].itertuples():
+        try:
+            rxn = model.reactions.get_by_id(rxn_id)
+        except KeyError:
+            logger.warning(f"Reaction '{rxn_id}' not found in the model. " f"Ignored.")
+            continue
+        if rxn.lower_bound >= 0:
+            target = abs(flux)
+        elif rxn.upper_bound <= 0:
+            target = -abs(flux)
+        elif flux == 0 or formulation == "lp":
+            target = flux
+        else:
+            target = None
+        # Unless the direction of the flux is known, a binary variable chooses the
+        # direction.
+        is_binary = target is None or formulation == "milp"
+        formulations.append((rxn, is_binary))
+        targets[rxn.id] = flux if is_binary else target
+        weights[rxn.id] = weight
+
+    problem = _get_fitting_problem(model, formulations, big_m)
+    problem.update(targets)
+    kind = ("mi" if problem.is_mixed_integer else "") + ("lp" if linear else "qp")
     with model:
-        for rxn_id, flux, weight in data[[flux_col, weight_col]].itertuples():
-            try:
-                rxn = model.reactions.get_by_id(rxn_id)
-                direction = prob.Variable("direction_" + rxn_id, type="binary")
-                dist = prob.Variable("dist_" + rxn_id)
-                forward_pos = prob.Constraint(
-                    flux - rxn.flux_expression - big_m * (1 - direction) - dist,
-                    ub=0,
-                    name="forward_pos_" + rxn_id,
-                )
-                forward_neg = prob.Constraint(
-                    rxn.flux_expression - flux - big_m * (1 - direction) - dist,
-                    ub=0,
-                    name="forward_neg_" + rxn_id,
-                )
-                reverse_pos = prob.Constraint(
-                    (-flux) - rxn.flux_expression - big_m * direction - dist,
-                    ub=0,
-                    name="reverse_pos_" + rxn_id,
-                )
-                reverse_neg = prob.Constraint(
-                    rxn.flux_expression - (-flux) - big_m * direction - dist,
-                    ub=0,
-                    name="reverse_neg_" + rxn_id,
-                )
-                if linear:
-                    new_obj += dist / weight
-                else:
-                    new_obj += (dist / weight) ** 2
-                to_add.extend(
-                    [
-                        direction,
-                        dist,
-                        forward_pos,
-                        forward_neg,
-                        reverse_pos,
-                        reverse_neg,
-                    ]
-                )
-            except KeyError:
-                logger.warning(
-                    f"Reaction '{rxn_id}' not found in the model. " f"Ignored."
-                )
-        model.add_cons_vars(to_add)
-        model.objective = prob.Objective(new_obj, direction="min")
+        problem.add(model)
+        if linear:
+            model.objective = model.problem.Objective(Zero, direction="min")
+            model.objective.set_linear_coefficients(
+                {problem.distances[rxn_id]: 1 / w for rxn_id, w in weights.items()}
+            )
+        else:
+            model.objective = model.problem.Objective(
+                sum(
+                    (problem.distances[rxn_id] / w) ** 2
+                    for rxn_id, w in weights.items()
+                ),
+                direction="min",
+            )
+        logger.info(
+            f"Minimizing the distance to {len(data)} observed fluxes as {kind} problem"
+        )
+        start = time.time()
         solution = model.optimize(raise_error=True)
+        FLUX_ADJUSTMENT_TIME.labels("model", os.environ["ENVIRONMENT"], kind).observe(
+            time.time() - start
+        )
     return solution
 
 
+class _FittingProblem:
+    """
+    The variables and constraints measuring the distances of fluxes to observations.
+
+    The observed fluxes only occur in the bounds of the constraints, so that the problem
+    can be reused for new observations of the same reactions, see
+    `_get_fitting_problem`. The problem is only part of the solver of the model while
+    fitting, and does not reference the model itself, so that it can be cached without
+    keeping the model alive.
+    """
+
+    _numbers = itertools.count()
+
+    def __init__(self, model, formulations, big_m):
+        """
+        Build the problem.
+
+        Parameters
+        ----------
+        model : cobra.Model
+        formulations : list
+            Tuples of an observed reaction and whether the direction of its flux is
+            chosen by a binary variable, or known.
+        big_m : float
+            The big M value of the binary constraints.
+        """
+        prob = model.problem
+        # Number the problems, so that the names of their variables and constraints
+        # never clash with those of a problem built earlier.
+        number = next(self._numbers)
+        self.big_m = big_m
+        self.is_mixed_integer = any(is_binary for _, is_binary in formulations)
+        self.distances = {}
+        self.variables = []
+        self.constraints = []
+        self._variables = {}
+        self._constraints = {}
+        for rxn, is_binary in formulations:
+            self._variables[rxn.id] = (rxn.forward_variable, rxn.reverse_variable)
+            flux = rxn.flux_expression
+            dist = prob.Variable(f"dist_{number}_{rxn.id}", lb=0)
+            self.distances[rxn.id] = dist
+            self.variables.append(dist)
+            if is_binary:
+                direction = prob.Variable(f"direction_{number}_{rxn.id}", type="binary")
+                self.variables.append(direction)
+                constraints = (
+                    prob.Constraint(
+                        flux + dist - big_m * direction,
+                        name=f"forward_pos_{number}_{rxn.id}",
+                    ),
+                    prob.Constraint(
+                        flux - dist + big_m * direction,
+                        name=f"forward_neg_{number}_{rxn.id}",
+                    ),
+                    prob.Constraint(
+                        flux + dist + big_m * direction,
+                        name=f"reverse_pos_{number}_{rxn.id}",
+                    ),
+                    prob.Constraint(
+                        flux - dist - big_m * direction,
+                        name=f"reverse_neg_{number}_{rxn.id}",
+                    ),
+                )
+            else:
+                constraints = (
+                    prob.Constraint(flux + dist, name=f"pos_{number}_{rxn.id}"),
+                    prob.Constraint(flux - dist, name=f"neg_{number}_{rxn.id}"),
+                )
+            self._constraints[rxn.id] = constraints
+            self.constraints.extend(constraints)
+
+    def is_valid(self, model):
+        """Return whether the problem still applies to the given model."""
+        for rxn_id, (forward, reverse) in self._variables.items():
+            if rxn_id not in model.reactions:
+                return False
+            rxn = model.reactions.get_by_id(rxn_id)
+            # Compare by identity, as variables are equal if their names are.
+            if rxn.forward_variable is not forward:
+                return False
+            if rxn.reverse_variable is not reverse:
+                return False
+        return True
+
+    def update(self, targets):
+        """
+        Set the observed fluxes.
+
+        Parameters
+        ----------
+        targets : dict
+            Map the ids of the observed reactions to their fluxes, or for reactions of
+            known direction, to their fluxes in that direction.
+        """
+        for rxn_id, target in targets.items():
+            constraints = self._constraints[rxn_id]
+            if len(constraints) == 4:
+                # Big M constraints equivalent to dist >= |flux - target| if the
+                # direction is 1 and to dist >= |flux + target| if it is 0.
+                forward_pos, forward_neg, reverse_pos, reverse_neg = constraints
+                forward_pos.lb = target - self.big_m
+                forward_neg.ub = target + self.big_m
+                reverse_pos.lb = -target
+                reverse_neg.ub = -target
+            else:
+                # dist >= |flux - target|
+                pos, neg = constraints
+                pos.lb = target
+                neg.ub = target
+
+    def add(self, model):
+        """Add the problem to the solver of the model until the model context exits."""
+        model.solver.add(self.variables + self.constraints)
+        get_context(model)(partial(self._remove, model.solver))
+
+    def _remove(self, solver):
+        # Remove the constraints before the variables. Otherwise, optlang substitutes
+        # the removed variables with zero in the constraints, which would then no
+        # longer measure the distances when the problem is reused.
+        solver.remove(self.constraints)
+        solver.update()
+        solver.remove(self.variables)
+        solver.update()
+
+
+def _get_fitting_problem(model, formulations, big_m):
+    """
+    Return a problem fitting the fluxes of the model to observations.
+
+    Building the problem may take longer than solving it, so unless the cache is
+    disabled, the problem is kept to be reused for the same reactions and formulations.
+    The problems of each model are cached separately.
+    """
+    problems = _FITTING_PROBLEMS.get(model)
+    if problems is None:
+        problems = _FITTING_PROBLEMS.setdefault(
+            model,
+            LRUCache("fitting_problems", app.config["FITTING_PROBLEM_CACHE_SIZE"]),
+        )
+    key = (big_m, tuple((rxn.id, is_binary) for rxn, is_binary in formulations))
+    problem = problems.get(key)
+    if problem is None or not problem.is_valid(model):
+        # Either there is no such problem yet, or the model changed since it was built,
+        # e.g., its solver was replaced.
+        problem = _FittingProblem(model, formulations, big_m)
+        problems.set(key, problem)
+    return problem
+
+
 def flexibilize_proteomics(
-    model, biomass_reaction, growth_rate, proteomics, uptake_secretion_rates
+    model,
+    biomass_reaction,
+    growth_rate,
+    proteomics,
+    uptake_secretion_rates,
+    proteins_per_iteration=1,
 ):
     """
     Replace proteomics measurements with a set that enables the model to grow.
@@ -186,6 +374,11 @@ def flexibilize_proteomics(
         List of measurements matching the `Proteomics` schema.
     uptake_secretion_rates: list(dict)
         List of measurements matching the `UptakeSecretionRates` schema.
+    proteins_per_iteration: int
+        The number of proteins with the lowest shadow prices to remove before the model
+        is optimized again. Removing more than one protein at a time requires fewer
+        optimizations, but may remove proteins that are not necessary to reach the
+        growth rate.
 
     Returns
     -------
@@ -220,52 +413,59 @@ def flexibilize_proteomics(
     # reset growth rate in model:
     model.reactions.get_by_id(biomass_reaction).bounds = (0, 1000)
 
-    # build a table with protein ids, met ids in model and values to constrain with:
-    prot_df = pd.DataFrame()
-    for protein in proteomics:
-        protein_id = protein["identifier"]
-        lb, ub = bounds(protein["measurement"], protein["uncertainty"])
-        for met in model.metabolites.query(lambda m: protein_id in m.id):
-            new_row = pd.DataFrame(
-                data={"met_id": met.id, "value": ub}, index=[protein_id]
-            )
-            prot_df = prot_df.append(new_row)
+    # look up the measured proteins in the protein index of the model, and keep their
+    # upper bounds (as enzymes can be unsaturated) in an array:
+    proteins = index_proteins(model)
+    upper_bounds = {
+        protein["identifier"]: bounds(protein["measurement"], protein["uncertainty"])[1]
+        for protein in proteomics
+    }
+    positions = proteins.positions(upper_bounds)
+    upper_bounds = np.array(list(upper_bounds.values()))
+    # ignore proteins not in the model, and rank the others in the order of the index
+    # so that proteins with equal shadow prices are removed in the same order as in
+    # cobrapy solutions:
+    order = np.argsort(positions)
+    order = order[positions[order] >= 0]
+    positions, upper_bounds = positions[order], upper_bounds[order]
+    met_ids = proteins.metabolite_ids[positions]
 
     # constrain the model with all proteins and optimize:
-    limit_proteins(model, prot_df["value"])
-    solution = model.optimize()
-    new_growth_rate = solution.objective_value
+    proteins.limit(model, positions, upper_bounds)
+    new_growth_rate = model.slim_optimize()
 
     # define the minimal growth required by the flexibilization based on the lower bound
     # of the growth rate, plus an extra 5%  to ensure feasible simulations later on:
     minimal_growth, ub = bounds(growth_rate["measurement"], growth_rate["uncertainty"])
     minimal_growth *= 1.05
 
-    # while the model cannot grow to the desired level, remove the protein with
-    # the highest shadow price:
+    # while the model cannot grow to the desired level, remove the proteins with the
+    # lowest shadow prices, i.e., the ones limiting growth the most. Only bounds change
+    # between iterations, so the solver starts from the previous optimal basis.
+    remaining = np.arange(len(positions))
     prots_to_remove = []
-    while new_growth_rate < minimal_growth and not prot_df.empty:
-        # get most influential protein in model:
-        top_protein = top_shadow_prices(solution, list(prot_df["met_id"]))
-        top_protein = top_protein.index[0]
-        top_protein = prot_df.index[prot_df["met_id"] == top_protein][0]
-
-        # update data: append protein to list, remove from current dataframe and
-        # increase the corresponding upper bound to +1000:
-        prots_to_remove.append(top_protein)
-        prot_df = prot_df.drop(labels=top_protein)
-        limit_proteins(model, pd.Series(data=[1000], index=[top_protein]))
-        warning = (
-            f"Removed protein '{top_protein}' from the proteomics data for feasible "
-            f"simulations"
-        )
-        warnings.append(warning)
+    while new_growth_rate < minimal_growth and len(remaining):
+        shadow_prices = model.solver.shadow_prices
+        prices = np.array([shadow_prices[met_ids[i]] for i in remaining])
+        order = np.argsort(prices)[:proteins_per_iteration]
+        top_proteins = positions[remaining[order]]
+        remaining = np.delete(remaining, order)
+
+        # update data: append proteins to list and increase the corresponding upper
+        # bounds to +1000:
+        proteins.limit(model, top_proteins, np.full(len(top_proteins), 1000))
+        for position in top_proteins:
+            prots_to_remove.append(proteins.ids[position])
+            warnings.append(
+                f"Removed protein '{proteins.ids[position]}' from the proteomics data "
+                f"for feasible simulations"
+            )
 
         # re-compute solution:
-        solution = model.optimize()
-        if solution.objective_value == new_growth_rate:  # the algorithm is stuck
+        growth = model.slim_optimize()
+        if growth == new_growth_rate:  # the algorithm is stuck
             break
-        new_growth_rate = solution.objective_value
+        new_growth_rate = growth
 
     # update growth rate if optimization was not successful:
     if new_growth_rate < minimal_growth:
@@ -275,17 +475,8 @@ def flexibilize_proteomics(
             growth_rate["measurement"] = new_growth_rate
 
     # update proteomics by removing flexibilized proteins:
-    for protein in prots_to_remove:
-        index = next(
-            (
-                index
-                for (index, dic) in enumerate(proteomics)
-                if dic["identifier"] == protein
-            ),
-            None,
-        )
-        del proteomics[index]
-
+    prots_to_remove = set(prots_to_remove)
+    proteomics[:] = [p for p in proteomics if p["identifier"] not in prots_to_remove]
     return growth_rate, proteomics, warnings
 
 
@@ -299,40 +490,12 @@ def limit_proteins(model, measurements):
     measurements : pd.Series
         Protein abundances in mmol / gDW.
     """
-    for protein_id, measure in measurements.items():
-        try:
-            rxn = model.reactions.get_by_id(f"prot_{protein_id}_exchange")
-        except KeyError:
-            pass
-        else:
-            # update only upper_bound (as enzymes can be unsaturated):
-            rxn.bounds = (0, measure)
-    return
-
-
-def top_shadow_prices(solution, met_ids, top=1):
-    """
-    Retrieve shadow prices for a list of metabolites from the solution.
-
-    Rank the shadow prices from most to least sensitive in the model.
-
-    Parameters
-    ----------
-    solution: cobra.Solution
-        The usual Solution object returned by model.optimize().
-    met_ids: iterable of strings
-        Subset of metabolite IDs from the model.
-    top: int
-        The number of metabolites to be returned.
-
-    Returns
-    -------
-    shadow_pr: pd.Series
-        Top shadow prices, ranked.
-    """
-    shadow_pr = solution.shadow_prices
-    shadow_pr = shadow_pr.loc[shadow_pr.index.isin(met_ids)]
-    return shadow_pr.sort_values()[:top]
+    proteins = index_proteins(model)
+    positions = proteins.positions(measurements.index)
+    # ignore proteins not in the model:
+    proteins.limit(
+        model, positions[positions >= 0], measurements.values[positions >= 0]
+    )
 
 
 def bounds(measurement, uncertainty):
@@ -17,29 +17,43 @@ import logging
 from cobra import Metabolite, Reaction
 
 from simulations.exceptions import CompartmentNotFound
-from simulations.modeling.cobra_helpers import parse_bigg_compartment
+from simulations.modeling.cobra_helpers import (
+    find_genes,
+    invalidate_indices,
+    parse_bigg_compartment,
+    set_bounds,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
 def apply_operations(model, operations):
+    # Bound changes by modifications and knockouts are collected and set at once, as
+    # they typically make up most of the operations. The collected bounds are set before
+    # reactions are added or removed, and at the end.
+    bounds = {}
     for operation in operations:
         if operation["operation"] == "add" and operation["type"] == "reaction":
+            set_bounds(model, bounds)
+            bounds.clear()
             _add_reaction(model, operation["data"])
         elif operation["operation"] == "modify" and operation["type"] == "reaction":
-            _modify_reaction(model, operation["id"], operation["data"])
+            _modify_reaction(model, bounds, operation["id"], operation["data"])
         elif operation["operation"] == "knockout" and operation["type"] == "reaction":
-            _knockout_reaction(model, operation["id"])
+            _knockout_reaction(model, bounds, operation["id"])
         elif operation["operation"] == "knockout" and operation["type"] == "gene":
-            _knockout_gene(model, operation["id"])
+            _knockout_gene(model, bounds, operation["id"])
         elif operation["operation"] == "remove" and operation["type"] == "reaction":
+            set_bounds(model, bounds)
+            bounds.clear()
             _remove_reaction(model, operation["id"])
         else:
             raise ValueError(
                 f"Invalid operation: Cannot perform operation "
                 f"'{operation['operation']}' on type '{operation['type']}'"
             )
+    set_bounds(model, bounds)
 
 
 def _parse_metabolite(metabolite_id, model):
@@ -69,27 +83,35 @@ def _add_reaction(model, data):
     )
     model.add_reactions([reaction])
     reaction.add_metabolites(data["metabolites"])
+    invalidate_indices(model)
 
 
-def _modify_reaction(model, id, data):
+def _modify_reaction(model, bounds, id, data):
     logger.debug(
         f"Setting bounds of reaction '{id}' to ({data['lower_bound']}, "
         f"{data['upper_bound']}) in model '{model.id}'"
     )
-    model.reactions.get_by_id(id).bounds = data["lower_bound"], data["upper_bound"]
+    reaction = model.reactions.get_by_id(id)
+    bounds[reaction] = data["lower_bound"], data["upper_bound"]
 
 
-def _knockout_reaction(model, id):
+def _knockout_reaction(model, bounds, id):
     logger.debug(f"Knocking out reaction '{id}' in model '{model.id}'")
-    model.reactions.get_by_id(id).knock_out()
+    bounds[model.reactions.get_by_id(id)] = 0, 0
 
 
 def _remove_reaction(model, id):
     logger.debug(f"Removing reaction '{id}' from model '{model.id}'")
     model.remove_reactions([model.reactions.get_by_id(id)])
+    invalidate_indices(model)
 
 
-def _knockout_gene(model, id):
+def _knockout_gene(model, bounds, id):
     logger.debug(f"Knocking out gene '{id}' in model '{model.id}'")
-    gene = model.genes.query(lambda g: id in (g.id, g.name))[0]
-    gene.knock_out()
+    gene = find_genes(model, id)[0]
+    # Knock out the gene like `gene.knock_out`, but collect the bounds of the reactions
+    # that are no longer functional.
+    gene.functional = False
+    for reaction in gene.reactions:
+        if not reaction.functional:
+            bounds[reaction] = 0, 0
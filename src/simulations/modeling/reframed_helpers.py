@@ -13,10 +13,216 @@
 # limitations under the License.
 
 import logging
+import re
+import tempfile
+import warnings
+from collections import OrderedDict
+
+import cobra
+import reframed
+from cobra.util.solver import linear_reaction_coefficients
+from reframed import (
+    CBModel,
+    CBReaction,
+    Compartment,
+    Gene,
+    GPRAssociation,
+    Metabolite,
+    Protein,
+)
 
 
 logger = logging.getLogger(__name__)
 
+try:
+    # These helpers of the SBML reader are not part of the public API of reframed.
+    from reframed.core.transformation import clean_bounds, fix_reversibility
+    from reframed.io.sbml import detect_external_compartment, reaction_type_detection
+except ImportError:
+    logger.warning(
+        "The installed reframed lacks the helpers of its SBML reader; converting "
+        "models to reframed through SBML files instead"
+    )
+    _SBML_HELPERS = False
+else:
+    _SBML_HELPERS = True
+
+# Characters which are not allowed in SBML identifiers, and the exchange reactions in
+# the BiGG flavor, as in `cobra.io.write_sbml_model` and `reframed.load_cbmodel`.
+_NON_SBML_CHARACTERS = re.compile(r"([^0-9_a-zA-Z])")
+_EXCHANGE_PATTERN = re.compile(r"^R_EX_")
+
+
+def to_reframed(model):
+    """
+    Convert a cobrapy model to a reframed model.
+
+    The result is the same as writing the model to SBML with
+    `cobra.io.write_sbml_model` and loading it with `reframed.load_cbmodel` in the BiGG
+    flavor, including the prefixed identifiers of reactions (`R_`), metabolites (`M_`)
+    and genes (`G_`), the metadata read from notes, and the warnings issued while
+    loading. However, no SBML document is built, written or parsed, unless the
+    installed reframed lacks the non-public helpers of its SBML reader used here.
+
+    Parameters
+    ----------
+    model: cobra.Model
+
+    Returns
+    -------
+    reframed.CBModel
+    """
+    if not _SBML_HELPERS:
+        return _to_reframed_via_sbml(model)
+    rf_model = CBModel(model.id)
+    for compartment_id, name in model.compartments.items():
+        rf_model.add_compartment(Compartment(compartment_id, name))
+
+    metabolite_ids = {}
+    for metabolite in model.metabolites:
+        metabolite_ids[metabolite] = _sbml_id(metabolite.id, "M_")
+        rf_metabolite = Metabolite(
+            metabolite_ids[metabolite], metabolite.name, metabolite.compartment
+        )
+        if metabolite.formula:
+            rf_metabolite.metadata["FORMULA"] = metabolite.formula
+        if metabolite.charge is not None:
+            rf_metabolite.metadata["CHARGE"] = str(int(metabolite.charge))
+        _add_notes(rf_metabolite, metabolite.notes)
+        rf_model.add_metabolite(rf_metabolite)
+
+    coefficients = linear_reaction_coefficients(model)
+    objective = OrderedDict()
+    for reaction in model.reactions:
+        # Reactants are listed before products, and metabolites without coefficient
+        # are dropped, as when reading them from SBML.
+        metabolites = reaction.metabolites
+        stoichiometry = OrderedDict(
+            (metabolite_ids[metabolite], coefficient)
+            for metabolite, coefficient in metabolites.items()
+            if coefficient < 0
+        )
+        stoichiometry.update(
+            (metabolite_ids[metabolite], coefficient)
+            for metabolite, coefficient in metabolites.items()
+            if coefficient > 0
+        )
+        rf_reaction = CBReaction(
+            _sbml_id(reaction.id, "R_"),
+            name=reaction.name,
+            reversible=reaction.lower_bound < 0,
+            stoichiometry=stoichiometry,
+            regulators=OrderedDict(),
+            lb=reaction.lower_bound,
+            ub=reaction.upper_bound,
+        )
+        _add_notes(rf_reaction, reaction.notes)
+        rf_model.add_reaction(rf_reaction)
+        if coefficients.get(reaction, 0) != 0:
+            objective[rf_reaction.id] = coefficients[reaction]
+    rf_model.set_objective(objective)
+
+    for gene in model.genes:
+        gene_id = _sbml_gene_id(gene.id)
+        rf_model.add_gene(Gene(gene_id, gene.name or gene_id))
+    for reaction in model.reactions:
+        rf_model.set_gpr_association(
+            _sbml_id(reaction.id, "R_"), _parse_gpr(reaction), add_genes=False
+        )
+
+    for reaction_id in rf_model.reactions:
+        rf_model.reactions[reaction_id].reaction_type = reaction_type_detection(
+            reaction_id, rf_model, None, _EXCHANGE_PATTERN
+        )
+    if len(rf_model.get_exchange_reactions()) == 0:
+        warnings.warn("Exchange reactions were not detected.")
+    detect_external_compartment(rf_model, True)
+    fix_reversibility(rf_model)
+    clean_bounds(rf_model)
+    return rf_model
+
+
+def _to_reframed_via_sbml(model):
+    """Convert a cobrapy model to a reframed model through a temporary SBML file."""
+    with tempfile.NamedTemporaryFile() as file_:
+        cobra.io.write_sbml_model(model, file_.name)
+        return reframed.load_cbmodel(file_.name, flavor="bigg")
+
+
+def _sbml_id(id, prefix):
+    return prefix + _NON_SBML_CHARACTERS.sub(lambda m: f"__{ord(m.group())}__", id)
+
+
+def _sbml_gene_id(id):
+    return _sbml_id(id, "G_").replace(".", "__SBML_DOT__")
+
+
+def _add_notes(element, notes):
+    """Add the notes of a cobrapy object to the metadata of a reframed object."""
+    for key, value in notes.items():
+        # reframed splits notes at the first colon.
+        key, value = f"{key}: {value}".split(":", 1)
+        element.metadata[key.strip()] = value.strip()
+
+
+def _parse_gpr(reaction):
+    """
+    Return the GPR association of a reaction in disjunctive normal form.
+
+    Nested associations of the same kind are flattened, like libSBML does. Other rules
+    are not in disjunctive normal form, and no association is returned after warning
+    about it, like reframed does.
+    """
+    tokens = reaction.gene_reaction_rule.replace("(", "( ").replace(")", " )").split()
+    if not tokens:
+        return None
+    position = 0
+
+    def parse(operator):
+        # Parse a disjunction of conjunctions, or a conjunction of genes or
+        # parenthesized disjunctions, where "and" takes precedence over "or".
+        nonlocal position
+        terms = []
+        while True:
+            if operator == "or":
+                term = parse("and")
+            elif tokens[position] == "(":
+                position += 1
+                term = parse("or")
+                position += 1
+            else:
+                term = _sbml_gene_id(tokens[position])
+                position += 1
+            if isinstance(term, tuple) and term[0] == operator:
+                terms.extend(term[1])
+            else:
+                terms.append(term)
+            if position < len(tokens) and tokens[position] == operator:
+                position += 1
+            else:
+                return terms[0] if len(terms) == 1 else (operator, terms)
+
+    expression = parse("or")
+    if isinstance(expression, str):
+        proteins = [[expression]]
+    elif expression[0] == "and":
+        proteins = [expression[1]]
+    else:
+        proteins = [
+            [term] if isinstance(term, str) else term[1] for term in expression[1]
+        ]
+    if any(not isinstance(gene, str) for genes in proteins for gene in genes):
+        warnings.warn(
+            f"Gene association for reaction {_sbml_id(reaction.id, 'R_')} is not DNF"
+        )
+        return None
+    gpr = GPRAssociation()
+    for genes in proteins:
+        protein = Protein()
+        protein.genes = list(genes)
+        gpr.proteins.append(protein)
+    return gpr
+
 
 def create_metabolite_id2name_mapping(external_metabolite_ids, community):
     """
@@ -0,0 +1,174 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Read and write the compact binary index of salt dissociations.
+
+The index maps ChEBI ids of salts to the ions and metals they dissociate into, as
+generated by `scripts/update_salts.py`. It is memory-mapped and only the requested
+entries are decoded, so the file is loaded lazily and its pages are shared between all
+processes reading it.
+
+All integers are unsigned 32-bit little-endian. The file consists of:
+
+* A header with the magic bytes `SALT`, the format version, the number of strings, the
+  number of salts and the total number of list items.
+* The offsets of all strings in the string data, plus the end offset.
+* For every salt, the start offsets of its four lists (see `FIELDS`) into the list
+  items, plus the end offset of the last list.
+* The list items, as indices of strings.
+* The string data, UTF-8 encoded.
+
+Every distinct string is stored only once. The first strings are the salt ids, sorted,
+so that salt `i` is string `i` and salts can be found by binary search.
+"""
+
+import logging
+import mmap
+import struct
+import threading
+from collections.abc import Mapping
+
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("ions", "ions_missing_smiles", "metals", "metals_missing_inchi")
+
+_MAGIC = b"SALT"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIII")
+_UINT = struct.Struct("<I")
+
+
+class SaltsIndex(Mapping):
+    """
+    A read-only mapping of salt ids to their dissociation, backed by an index file.
+
+    Values are dicts with a list of ChEBI ids or unmapped identifiers for each of the
+    keys in `FIELDS`, as in the original `salts.json` format. The file is opened on
+    first access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        with self._lock:
+            if self._buffer is not None:
+                return
+            with open(self.path, "rb") as file_:
+                buffer = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, strings, salts, items = _HEADER.unpack_from(buffer)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{self.path} is not a salts index of version 1")
+            logger.debug(f"Opened salts index {self.path} with {salts} salts")
+            self._strings = strings
+            self._salts = salts
+            self._string_offsets = _HEADER.size
+            self._list_offsets = self._string_offsets + (strings + 1) * _UINT.size
+            self._items = self._list_offsets + (salts * len(FIELDS) + 1) * _UINT.size
+            self._data = self._items + items * _UINT.size
+            self._buffer = buffer
+
+    def _uint(self, offset, index):
+        return _UINT.unpack_from(self._buffer, offset + index * _UINT.size)[0]
+
+    def _string(self, index):
+        start = self._uint(self._string_offsets, index)
+        end = self._uint(self._string_offsets, index + 1)
+        return self._buffer[self._data + start : self._data + end]
+
+    def _find(self, key):
+        """Return the index of the given salt id, or -1 if not found."""
+        if self._buffer is None:
+            self._open()
+        if not isinstance(key, str):
+            return -1
+        key = key.encode("utf-8")
+        low, high = 0, self._salts
+        while low < high:
+            middle = (low + high) // 2
+            if self._string(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._salts and self._string(low) == key:
+            return low
+        return -1
+
+    def __getitem__(self, key):
+        index = self._find(key)
+        if index < 0:
+            raise KeyError(key)
+        salt = {}
+        for position, field in enumerate(FIELDS):
+            start = self._uint(self._list_offsets, index * len(FIELDS) + position)
+            end = self._uint(self._list_offsets, index * len(FIELDS) + position + 1)
+            salt[field] = [
+                self._string(self._uint(self._items, item)).decode("utf-8")
+                for item in range(start, end)
+            ]
+        return salt
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __len__(self):
+        if self._buffer is None:
+            self._open()
+        return self._salts
+
+    def __iter__(self):
+        if self._buffer is None:
+            self._open()
+        for index in range(self._salts):
+            yield self._string(index).decode("utf-8")
+
+
+def write_index(salts, path):
+    """
+    Write the given salt dissociations to an index file.
+
+    Parameters
+    ----------
+    salts: dict
+        A map of salt ids to dicts with lists of identifiers for each of the keys in
+        `FIELDS`.
+    path: str
+        The path of the index file to write.
+    """
+    keys = sorted(salts, key=lambda key: key.encode("utf-8"))
+    strings = {key: index for index, key in enumerate(keys)}
+    list_offsets = []
+    items = []
+    for key in keys:
+        for field in FIELDS:
+            list_offsets.append(len(items))
+            for value in salts[key][field]:
+                items.append(strings.setdefault(value, len(strings)))
+    list_offsets.append(len(items))
+
+    string_offsets = [0]
+    data = bytearray()
+    for string in strings:
+        data += string.encode("utf-8")
+        string_offsets.append(len(data))
+
+    with open(path, "wb") as file_:
+        file_.write(_HEADER.pack(_MAGIC, _VERSION, len(strings), len(keys), len(items)))
+        for values in (string_offsets, list_offsets, items):
+            file_.write(struct.pack(f"<{len(values)}I", *values))
+        file_.write(data)
@@ -0,0 +1,263 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Build cobrapy models incrementally from streamed JSON documents.
+
+`cobra.io.model_from_dict` requires the complete serialized model as a dict, so while
+a model is loaded, the response text, the parsed dict and the resulting model are all
+kept in memory. The reader in this module instead decodes the metabolites, genes and
+reactions of the serialized model one at a time from a file-like object, turning each
+of them into a cobrapy object before the next one is read.
+"""
+
+import json
+import logging
+
+from cobra import Model
+from cobra.io.dict import gene_from_dict, metabolite_from_dict, reaction_from_dict
+from cobra.util.solver import set_objective
+
+
+logger = logging.getLogger(__name__)
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class JSONStreamReader:
+    """
+    Read a JSON document piece by piece from a text file-like object.
+
+    Only the text of the value currently being decoded is kept in memory. Containers
+    can either be decoded as a whole with `value`, or walked with `keys` and `items`.
+    """
+
+    def __init__(self, file_, chunk_size=2 ** 16):
+        self._file = file_
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _read(self):
+        """Append the next chunk to the buffer, dropping the consumed text."""
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or '' at the end."""
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACE
+            ):
+                self._position += 1
+            if self._position < len(self._buffer) or self._eof:
+                return self._buffer[self._position : self._position + 1]
+            self._read()
+
+    def _consume(self, character):
+        found = self._peek()
+        if found != character:
+            raise ValueError(
+                f"Expected '{character}' but found '{found}' in JSON document"
+            )
+        self._position += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._position)
+            except ValueError:
+                if self._eof:
+                    raise
+                self._read()
+                continue
+            # A number at the end of the buffer may continue in the next chunk, so
+            # only accept values followed by a delimiter.
+            if not self._eof and (
+                end == len(self._buffer) or self._buffer[end] not in _DELIMITERS
+            ):
+                self._read()
+                continue
+            self._position = end
+            return value
+
+    def at_end(self):
+        """Return whether the document has been read completely."""
+        return self._peek() == ""
+
+    def keys(self):
+        """
+        Iterate over the keys of the next JSON object.
+
+        The value of each key must be consumed, with `value`, `keys` or `items`, before
+        advancing to the next key.
+        """
+        self._consume("{")
+        if self._peek() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self.value()
+            self._consume(":")
+            yield key
+            if self._peek() == ",":
+                self._position += 1
+            else:
+                self._consume("}")
+                return
+
+    def items(self):
+        """Iterate over the decoded elements of the next JSON array."""
+        self._consume("[")
+        if self._peek() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self.value()
+            if self._peek() == ",":
+                self._position += 1
+            else:
+                self._consume("]")
+                return
+
+
+class _ModelBuilder:
+    """Assemble a cobrapy model from serialized parts arriving in any order."""
+
+    def __init__(self):
+        self.model = Model()
+        self._metabolites = []
+        self._reactions = []
+        self._pending_reactions = []
+        self._coefficients = {}
+
+    def _flush_metabolites(self):
+        if self._metabolites:
+            self.model.add_metabolites(self._metabolites)
+            self._metabolites = []
+
+    def add_metabolite(self, data):
+        self._metabolites.append(metabolite_from_dict(data))
+
+    def add_gene(self, data):
+        # Reactions are only added to the model at the end, where their genes are
+        # matched with these ones, so the order of genes and reactions is irrelevant.
+        self.model.genes.append(gene_from_dict(data))
+
+    def add_reaction(self, data):
+        self._flush_metabolites()
+        if any(
+            not self.model.metabolites.has_id(m) for m in data.get("metabolites", ())
+        ):
+            # Metabolites may be listed after the reactions; build the reaction then.
+            self._pending_reactions.append(data)
+            return
+        if data.get("objective_coefficient", 0) != 0:
+            self._coefficients[data["id"]] = data["objective_coefficient"]
+        self._reactions.append(reaction_from_dict(data, self.model))
+
+    def finish(self):
+        self._flush_metabolites()
+        pending, self._pending_reactions = self._pending_reactions, []
+        for data in pending:
+            self.add_reaction(data)
+        if self._pending_reactions:
+            raise ValueError(
+                f"Reaction '{self._pending_reactions[0]['id']}' references unknown "
+                f"metabolites"
+            )
+        self.model.add_reactions(self._reactions)
+        self._reactions = []
+        set_objective(
+            self.model,
+            {
+                self.model.reactions.get_by_id(reaction_id): coefficient
+                for reaction_id, coefficient in self._coefficients.items()
+            },
+        )
+        return self.model
+
+
+def read_model(reader):
+    """
+    Read a serialized cobrapy model, as from `cobra.io.model_to_dict`.
+
+    Parameters
+    ----------
+    reader: JSONStreamReader
+        A reader positioned at the start of the serialized model object.
+
+    Returns
+    -------
+    cobra.Model
+    """
+    builder = _ModelBuilder()
+    has_reactions = False
+    add = {
+        "metabolites": builder.add_metabolite,
+        "genes": builder.add_gene,
+        "reactions": builder.add_reaction,
+    }
+    for key in reader.keys():
+        if key in add:
+            has_reactions = has_reactions or key == "reactions"
+            for data in reader.items():
+                add[key](data)
+        elif key in {"id", "name", "notes", "compartments", "annotation"}:
+            setattr(builder.model, key, reader.value())
+        else:
+            reader.value()
+    if not has_reactions:
+        raise ValueError("Object has no reactions attribute. Cannot load.")
+    return builder.finish()
+
+
+def read_model_document(file_, model_key, chunk_size=2 ** 16):
+    """
+    Read a JSON object containing a serialized cobrapy model.
+
+    Parameters
+    ----------
+    file_: file-like
+        A text file-like object containing the JSON document.
+    model_key: str
+        The key of the serialized model in the top-level object.
+    chunk_size: int
+        The number of characters to read at a time.
+
+    Returns
+    -------
+    dict
+        The top-level object, where the serialized model is replaced by the
+        corresponding `cobra.Model`.
+    """
+    reader = JSONStreamReader(file_, chunk_size)
+    document = {}
+    for key in reader.keys():
+        if key == model_key:
+            document[key] = read_model(reader)
+        else:
+            document[key] = reader.value()
+    if not reader.at_end():
+        raise ValueError("Extra data after the JSON document")
+    return document
@@ -13,17 +13,52 @@
 # limitations under the License.
 
 import logging
+import multiprocessing
+import os
+import time
 
+import pandas as pd
 from cobra.exceptions import OptimizationError
 from cobra.flux_analysis import flux_variability_analysis, pfba
 
+from simulations.app import app
+from simulations.exceptions import ReactionNotFound
+from simulations.metrics import FVA_REACTION_TIME
+from simulations.modeling.cobra_helpers import get_exchanges
+
 
 logger = logging.getLogger(__name__)
 
+# The model analysed by each process of a flux variability analysis pool, inherited
+# from the forking worker. See `_flux_variability_analysis`.
+_FVA_MODEL = None
+
 METHODS = ["fba", "pfba", "fva", "pfba-fva"]
 
 
-def simulate(model, biomass_reaction, method, objective_id, objective_direction):
+def simulate(
+    model,
+    biomass_reaction,
+    method,
+    objective_id,
+    objective_direction,
+    reactions=None,
+    exchanges_only=False,
+    subsystems=None,
+):
+    """
+    Simulate the model with the given method and objective.
+
+    For the flux variability methods, the analysis is restricted to the reactions
+    selected by `reactions`, `exchanges_only` and `subsystems`. A reaction is analysed
+    if it is selected by any of them; if none are given, all reactions are analysed.
+    The biomass reaction is always analysed to determine the growth rate.
+
+    Raises
+    ------
+    ReactionNotFound
+        If any of the given `reactions` are not in the model.
+    """
     if method not in METHODS:
         raise ValueError(f"Unsupported simulation method '{method}'")
 
@@ -39,12 +74,20 @@ def simulate(model, biomass_reaction, method, objective_id, objective_direction)
         elif method == "pfba":
             solution = pfba(model)
         elif method == "fva":
-            # FIXME: accept list of relevant fva reactions to calculate
-            solution = flux_variability_analysis(model)
+            solution = _flux_variability_analysis(
+                model,
+                _fva_reactions(
+                    model, biomass_reaction, reactions, exchanges_only, subsystems
+                ),
+            )
         elif method == "pfba-fva":
-            # FIXME: accept list of relevant fva reactions to calculate
-            solution = flux_variability_analysis(
-                model, fraction_of_optimum=1, pfba_factor=1.05
+            solution = _flux_variability_analysis(
+                model,
+                _fva_reactions(
+                    model, biomass_reaction, reactions, exchanges_only, subsystems
+                ),
+                fraction_of_optimum=1,
+                pfba_factor=1.05,
             )
     except OptimizationError as error:
         logger.info(f"Optimization Error: {error}")
@@ -63,3 +106,69 @@ def simulate(model, biomass_reaction, method, objective_id, objective_direction)
             growth_rate = flux_distribution[biomass_reaction]["upper_bound"]
         logger.info(f"Simulation was successful with growth rate {growth_rate}")
         return flux_distribution, growth_rate
+
+
+def _fva_reactions(model, biomass_reaction, reactions, exchanges_only, subsystems):
+    """Return the ids of the reactions selected for flux variability analysis."""
+    if not reactions and not exchanges_only and not subsystems:
+        return None
+    selected = {biomass_reaction}
+    if reactions:
+        unknown = [id for id in reactions if id not in model.reactions]
+        if unknown:
+            raise ReactionNotFound(
+                f"Could not find reactions {', '.join(unknown)} for model {model.id}"
+            )
+        selected.update(reactions)
+    if exchanges_only:
+        selected.update(reaction.id for reaction in get_exchanges(model))
+    if subsystems:
+        subsystems = set(subsystems)
+        selected.update(r.id for r in model.reactions if r.subsystem in subsystems)
+    # Keep the order of the model for reproducible results.
+    return [reaction.id for reaction in model.reactions if reaction.id in selected]
+
+
+def _flux_variability_analysis(model, reaction_list, **kwargs):
+    """
+    Run flux variability analysis on the given reactions, or all if None.
+
+    With `FVA_PROCESSES` greater than 1, the reactions are split between a pool of
+    processes forked from the worker. The modified model is passed to them by
+    inheritance, like cobrapy does, so it is shared rather than serialized. The forked
+    processes only solve the model, so they don't use any locks held by other threads
+    of the worker, e.g., loading models in the background.
+    """
+    if reaction_list is None:
+        reaction_list = [reaction.id for reaction in model.reactions]
+    count = len(reaction_list)
+    processes = min(app.config["FVA_PROCESSES"], count)
+    start_time = time.time()
+    if processes > 1:
+        size = -(-count // processes)
+        chunks = [reaction_list[i : i + size] for i in range(0, count, size)]
+        with multiprocessing.get_context("fork").Pool(
+            processes, initializer=_init_fva_process, initargs=(model,)
+        ) as pool:
+            solution = pd.concat(
+                pool.starmap(_analyse_fva_chunk, [(chunk, kwargs) for chunk in chunks])
+            )
+    else:
+        solution = flux_variability_analysis(
+            model, reaction_list, processes=1, **kwargs
+        )
+    duration = time.time() - start_time
+    FVA_REACTION_TIME.labels("model", os.environ["ENVIRONMENT"]).observe(
+        duration / count
+    )
+    logger.info(f"Flux variability analysis of {count} reactions took {duration:.2f}s")
+    return solution
+
+
+def _init_fva_process(model):
+    global _FVA_MODEL
+    _FVA_MODEL = model
+
+
+def _analyse_fva_chunk(reaction_list, kwargs):
+    return flux_variability_analysis(_FVA_MODEL, reaction_list, processes=1, **kwargs)
@@ -21,8 +21,8 @@ from flask_apispec.extension import FlaskApiSpec
 from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
 from prometheus_client.multiprocess import MultiProcessCollector
 
-from simulations import storage
-from simulations.exceptions import Forbidden, ModelNotFound, Unauthorized
+from simulations import cache, storage
+from simulations.exceptions import ReactionNotFound
 from simulations.modeling import community
 from simulations.modeling.adapter import (
     apply_genotype,
@@ -32,6 +32,7 @@ from simulations.modeling.adapter import (
 from simulations.modeling.operations import apply_operations
 from simulations.modeling.simulations import simulate
 from simulations.schemas import (
+    BatchSimulationRequest,
     CommunitySimulationRequest,
     ModificationRequest,
     SimulationRequest,
@@ -50,6 +51,9 @@ def init_app(app):
         "/models/<int:model_id>/modify", view_func=model_modify, methods=["POST"]
     )
     app.add_url_rule("/simulate", view_func=model_simulate, methods=["POST"])
+    app.add_url_rule(
+        "/simulate/batch", view_func=model_simulate_batch, methods=["POST"]
+    )
     app.add_url_rule(
         "/community/simulate", view_func=model_community_simulate, methods=["POST"]
     )
@@ -57,6 +61,7 @@ def init_app(app):
     docs = FlaskApiSpec(app)
     docs.register(model_modify, endpoint=model_modify.__name__)
     docs.register(model_simulate, endpoint=model_simulate.__name__)
+    docs.register(model_simulate_batch, endpoint=model_simulate_batch.__name__)
     docs.register(model_community_simulate, endpoint=model_community_simulate.__name__)
 
 
@@ -75,24 +80,25 @@ def model_modify(
     if not request.is_json:
         abort(415, "Non-JSON request content is not supported")
 
-    try:
-        model_wrapper = storage.get(model_id)
-    except Unauthorized as error:
-        abort(401, error.message)  # noqa: B306
-    except Forbidden as error:
-        abort(403, error.message)  # noqa: B306
-    except ModelNotFound as error:
-        abort(404, error.message)  # noqa: B306
+    model_wrapper = storage.get(model_id)
 
-    # Use the context manager to undo all modifications to the shared model instance on
+    # Use a checkpoint to undo all modifications to the shared model instance on
     # completion.
-    with model_wrapper.model as model:
+    with model_wrapper.checkpoint() as model:
         # Build list of operations to perform on the model
         operations = []
         warnings = []
         errors = []
         if medium:
-            results = apply_medium(model, model_wrapper.is_ec_model, medium)
+            # The same media are commonly applied to the same models, so reuse the
+            # result and only replay its operations on the model.
+            key = cache.medium_key(model_wrapper, medium)
+            results = cache.MEDIA.get(key)
+            if results is None:
+                results = apply_medium(model, model_wrapper.is_ec_model, medium)
+                cache.MEDIA.set(key, results)
+            elif not results[2]:
+                apply_operations(model, results[0])
             operations.extend(results[0])
             warnings.extend(results[1])
             errors.extend(results[2])
@@ -135,21 +141,73 @@ def model_modify(
 
 
 @use_kwargs(SimulationRequest)
-def model_simulate(model_id, method, objective_id, objective_direction, operations):
-    try:
-        model_wrapper = storage.get(model_id)
-    except Unauthorized as error:
-        abort(401, error.message)  # noqa: B306
-    except Forbidden as error:
-        abort(403, error.message)  # noqa: B306
-    except ModelNotFound as error:
-        abort(404, error.message)  # noqa: B306
-
-    model = model_wrapper.model
-
-    # Use the context manager to undo all modifications to the shared model instance on
+def model_simulate(
+    model_id,
+    method,
+    objective_id,
+    objective_direction,
+    operations,
+    reactions,
+    exchanges_only,
+    subsystems,
+):
+    model_wrapper = storage.get(model_id)
+
+    body = _simulate_scenario(
+        model_wrapper,
+        method,
+        objective_id,
+        objective_direction,
+        operations,
+        reactions,
+        exchanges_only,
+        subsystems,
+    )
+    return Response(body, mimetype="application/json")
+
+
+@use_kwargs(BatchSimulationRequest)
+def model_simulate_batch(model_id, scenarios):
+    model_wrapper = storage.get(model_id)
+
+    # Simulate all scenarios back to back on the same model instance. The solver keeps
+    # the basis of the previous solution, which is used as the starting point of the
+    # next solve.
+    bodies = [_simulate_scenario(model_wrapper, **scenario) for scenario in scenarios]
+    # Join the already serialized results rather than deserializing them again.
+    return Response(b"[" + b",".join(bodies) + b"]", mimetype="application/json")
+
+
+def _simulate_scenario(
+    model_wrapper,
+    method,
+    objective_id,
+    objective_direction,
+    operations,
+    reactions,
+    exchanges_only,
+    subsystems,
+):
+    """Return the serialized result of a simulation on the given model."""
+    # Identical requests on the same version of the model are answered with the
+    # previously serialized response, without applying operations or simulating.
+    key = cache.simulation_key(
+        model_wrapper,
+        method=method,
+        objective_id=objective_id,
+        objective_direction=objective_direction,
+        operations=operations,
+        reactions=reactions,
+        exchanges_only=exchanges_only,
+        subsystems=subsystems,
+    )
+    body = cache.SIMULATIONS.get(key)
+    if body is not None:
+        return body
+
+    # Use a checkpoint to undo all modifications to the shared model instance on
     # completion.
-    with model:
+    with model_wrapper.checkpoint() as model:
         apply_operations(model, operations)
         try:
             flux_distribution, growth_rate = simulate(
@@ -158,30 +216,28 @@ def model_simulate(model_id, method, objective_id, objective_direction, operatio
                 method,
                 objective_id,
                 objective_direction,
+                reactions,
+                exchanges_only,
+                subsystems,
             )
         except OptimizationError:
-            return jsonify({"status": model.solver.status})
+            result = {"status": model.solver.status}
+        except ReactionNotFound as error:
+            abort(400, str(error))
         else:
-            return jsonify(
-                {
-                    "status": model.solver.status,
-                    "flux_distribution": flux_distribution,
-                    "growth_rate": growth_rate,
-                }
-            )
+            result = {
+                "status": model.solver.status,
+                "flux_distribution": flux_distribution,
+                "growth_rate": growth_rate,
+            }
+    body = jsonify(result).get_data()
+    cache.SIMULATIONS.set(key, body)
+    return body
 
 
 @use_kwargs(CommunitySimulationRequest)
 def model_community_simulate(model_ids, medium, method):
-    try:
-        model_wrappers = [storage.get(model_id) for model_id in model_ids]
-    except Unauthorized as error:
-        abort(401, error.message)  # noqa: B306
-    except Forbidden as error:
-        abort(403, error.message)  # noqa: B306
-    except ModelNotFound as error:
-        abort(404, error.message)  # noqa: B306
-
+    model_wrappers = [storage.get(model_id) for model_id in model_ids]
     return community.simulate(model_wrappers, medium, method)
 
 
@@ -97,12 +97,27 @@ class ModificationRequest(Schema):
     growth_rate = fields.Nested(GrowthRate, missing=None)
 
 
-class SimulationRequest(Schema):
-    model_id = fields.Integer(required=True)
+class Scenario(Schema):
     method = fields.String(missing="fba")
     objective_id = fields.String(missing=None)
     objective_direction = fields.String(missing=None)
     operations = fields.Nested(Operation, many=True, missing=[])
+    # Reaction selectors for the flux variability methods; if none are given, all
+    # reactions are analysed.
+    reactions = fields.List(fields.String(), missing=None)
+    exchanges_only = fields.Boolean(missing=False)
+    subsystems = fields.List(fields.String(), missing=None)
+
+
+class SimulationRequest(Scenario):
+    model_id = fields.Integer(required=True)
+
+
+class BatchSimulationRequest(Schema):
+    model_id = fields.Integer(required=True)
+    scenarios = fields.Nested(
+        Scenario, many=True, required=True, validate=validate.Length(min=1)
+    )
 
 
 class CommunitySimulationRequest(Schema):
@@ -54,6 +54,54 @@ class Default:
         self.ICE_PASSWORD = os.environ["ICE_PASSWORD"]
         self.ID_MAPPER_API = os.environ["ID_MAPPER_API"]
         self.MODEL_STORAGE_API = os.environ["MODEL_STORAGE_API"]
+        # Directory for binary snapshots of deserialized public models. Leave unset to
+        # disable the disk cache.
+        self.MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR")
+        # Memory budget (in MiB) for the models cached by each worker. Proprietary
+        # models are evicted when it is exceeded; public models are never evicted.
+        self.MODEL_MEMORY_BUDGET = (
+            int(os.environ.get("MODEL_MEMORY_BUDGET", 2048)) * 1024 ** 2
+        )
+        # The number of public models to retrieve and deserialize concurrently on
+        # startup.
+        self.MODEL_PRELOAD_CONCURRENCY = int(
+            os.environ.get("MODEL_PRELOAD_CONCURRENCY", 4)
+        )
+        # Load models that are not cached in a background thread, responding with 202
+        # Accepted and a Retry-After header (in seconds) in the meantime, instead of
+        # holding the worker for the whole deserialization.
+        self.MODEL_BACKGROUND_LOADING = (
+            os.environ.get("MODEL_BACKGROUND_LOADING", "false").lower() == "true"
+        )
+        self.MODEL_LOADING_RETRY_AFTER = int(
+            os.environ.get("MODEL_LOADING_RETRY_AFTER", 10)
+        )
+        # Memory (in MiB) for cached responses of simulation requests in each worker,
+        # the number of seconds after which they expire, and an optional directory for
+        # sharing them between workers. Set the size to 0 to disable the cache.
+        self.SIMULATION_CACHE_SIZE = (
+            int(os.environ.get("SIMULATION_CACHE_SIZE", 64)) * 1024 ** 2
+        )
+        self.SIMULATION_CACHE_TTL = int(os.environ.get("SIMULATION_CACHE_TTL", 3600))
+        self.SIMULATION_CACHE_DIR = os.environ.get("SIMULATION_CACHE_DIR")
+        # The number of media applied to models for which to cache the resulting
+        # operations in each worker. Set to 0 to disable the cache.
+        self.MEDIUM_CACHE_SIZE = int(os.environ.get("MEDIUM_CACHE_SIZE", 256))
+        # The number of problems fitting fluxes to fluxomics measurements that are kept
+        # for each model for reuse. Set to 0 to disable the cache.
+        self.FITTING_PROBLEM_CACHE_SIZE = int(
+            os.environ.get("FITTING_PROBLEM_CACHE_SIZE", 8)
+        )
+        # The number of processes for flux variability analysis. The processes are
+        # forked from the worker for each analysis and share its model.
+        self.FVA_PROCESSES = int(os.environ.get("FVA_PROCESSES", 1))
+        # Connection pooling, timeouts (in seconds) and retries of outgoing requests
+        # to other API services.
+        self.HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+        self.HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+        self.HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 60))
+        self.HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 3))
+        self.HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.5))
         self.SENTRY_DSN = os.environ.get("SENTRY_DSN")
         self.SENTRY_CONFIG = {
             "ignore_exceptions": [
@@ -12,25 +12,52 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import io
 import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
-import requests
-from cobra.io.dict import model_from_dict
 from flask import g
 
+from simulations import http_client
 from simulations.app import app
-from simulations.exceptions import Forbidden, ModelNotFound, Unauthorized
+from simulations.exceptions import Forbidden, ModelLoading, ModelNotFound, Unauthorized
 from simulations.jwt import jwt_require_claim
+from simulations.metrics import (
+    CACHE_EVICTIONS,
+    CACHE_HITS,
+    CACHE_MISSES,
+    MODEL_LOAD_TIME,
+    PRELOADED_MODELS,
+)
+from simulations.modeling.cobra_helpers import checkpoint, index_genes, index_proteins
+from simulations.modeling.serialization import read_model_document
 
 
 logger = logging.getLogger(__name__)
 
+# The size in bytes of the chunks in which model documents are received.
+_CHUNK_SIZE = 2 ** 16
+
 
 class ModelWrapper:
     """A wrapper for a cobrapy model with some additional metadata."""
 
     def __init__(
-        self, id, model, project_id, organism_id, biomass_reaction, is_ec_model
+        self,
+        id,
+        model,
+        project_id,
+        organism_id,
+        biomass_reaction,
+        is_ec_model,
+        version=None,
     ):
         """
         Initialize the model wrapper.
@@ -53,6 +80,9 @@ class ModelWrapper:
             A string referencing the default biomass reaction in the given model.
         is_ec_model: bool
             A boolean indicating if the model is enzyme-constrained.
+        version: str
+            An identifier of the exact model revision, e.g. a digest of the serialized
+            model as received from the model warehouse, or None if unknown.
         """
         self.id = id
         self.model = model
@@ -62,18 +92,166 @@ class ModelWrapper:
         self.organism_id = organism_id
         self.biomass_reaction = biomass_reaction
         self.is_ec_model = is_ec_model
+        self.version = version
+        # Index the genes up front rather than on the first knockout in a request, and
+        # likewise the proteins for applying proteomics.
+        index_genes(self.model)
+        if is_ec_model:
+            index_proteins(self.model)
+
+    def checkpoint(self):
+        """
+        Return a context manager undoing all modifications of the model on exit.
+
+        Use this to modify the shared model instance while handling a request. See
+        `simulations.modeling.cobra_helpers.checkpoint`.
+        """
+        return checkpoint(self.model)
+
+
+# Approximate memory footprint in bytes of the individual parts of a model, used to
+# estimate the size of cached models. Measured with `tracemalloc` on iJO1366 and
+# eciML1515, plus an allowance for the solver's internal representation.
+REACTION_SIZE = 3500
+METABOLITE_SIZE = 1500
+GENE_SIZE = 700
+COEFFICIENT_SIZE = 300
+SOLVER_ENTITY_SIZE = 250
+
+
+def estimate_size(wrapper):
+    """Return the estimated memory footprint in bytes of the given model wrapper."""
+    model = wrapper.model
+    coefficients = sum(len(reaction.metabolites) for reaction in model.reactions)
+    return (
+        len(model.reactions) * REACTION_SIZE
+        + len(model.metabolites) * METABOLITE_SIZE
+        + len(model.genes) * GENE_SIZE
+        + coefficients * COEFFICIENT_SIZE
+        + (len(model.variables) + len(model.constraints)) * SOLVER_ENTITY_SIZE
+    )
+
+
+class ModelCache:
+    """
+    A least recently used cache of model wrappers within a memory budget.
+
+    When the estimated size of all cached models exceeds the configured
+    `MODEL_MEMORY_BUDGET`, the least recently used proprietary models are evicted.
+    Public models are pinned and never evicted.
+
+    The cache may be accessed concurrently, e.g. while preloading models in parallel.
+    """
+
+    def __init__(self):
+        self._wrappers = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self.size = 0
+
+    def __contains__(self, model_id):
+        return model_id in self._wrappers
+
+    def __len__(self):
+        return len(self._wrappers)
+
+    def __getitem__(self, model_id):
+        with self._lock:
+            wrapper = self._wrappers[model_id]
+            self._wrappers.move_to_end(model_id)
+            return wrapper
+
+    def get(self, model_id, default=None):
+        """Return the given model, or the default if it is not cached."""
+        with self._lock:
+            if model_id not in self._wrappers:
+                return default
+            return self[model_id]
+
+    def __setitem__(self, model_id, wrapper):
+        size = estimate_size(wrapper)
+        with self._lock:
+            self.pop(model_id)
+            self._wrappers[model_id] = wrapper
+            self._sizes[model_id] = size
+            self.size += size
+            self._evict(keep=model_id)
+
+    def __delitem__(self, model_id):
+        with self._lock:
+            del self._wrappers[model_id]
+            self.size -= self._sizes.pop(model_id)
+
+    def pop(self, model_id, default=None):
+        """Remove the given model from the cache and return it."""
+        with self._lock:
+            if model_id not in self._wrappers:
+                return default
+            wrapper = self._wrappers[model_id]
+            del self[model_id]
+            return wrapper
+
+    def _evict(self, keep):
+        """Evict least recently used proprietary models until within budget."""
+        budget = app.config["MODEL_MEMORY_BUDGET"]
+        # Iterate over a copy, ordered from least to most recently used.
+        for model_id, wrapper in list(self._wrappers.items()):
+            if self.size <= budget:
+                break
+            if model_id == keep or wrapper.project_id is None:
+                continue
+            logger.info(
+                f"Evicting model {model_id} from the cache ({self.size} bytes in use, "
+                f"budget is {budget} bytes)"
+            )
+            del self[model_id]
+            CACHE_EVICTIONS.labels("model", os.environ["ENVIRONMENT"], "models").inc()
+
 
+# Keep all loaded models in memory in this cache, keyed by our internal model storage
+# primary key id.
+_MODELS = ModelCache()
 
-# Keep all loaded models in memory in this dictionary, keyed by our internal
-# model storage primary key id.
-_MODELS = {}
+# Futures of the model loads in progress, keyed by model id and the credentials they
+# were requested with. Concurrent requests for the same model wait for the same load
+# instead of each retrieving and deserializing the model.
+_LOADING = {}
+_LOADING_LOCK = threading.Lock()
+_BACKGROUND_LOADER = ThreadPoolExecutor(max_workers=2)
 
 
 def get(model_id):
-    """Return a ModelWrapper instance for the given model id."""
-    if model_id not in _MODELS:
-        _load_model(model_id)
-    wrapper = _MODELS[model_id]
+    """
+    Return a ModelWrapper instance for the given model id.
+
+    Raises
+    ------
+    ModelLoading
+        If `MODEL_BACKGROUND_LOADING` is enabled and the model is not yet loaded. The
+        model is then loaded in a background thread, and the caller should retry
+        later.
+    """
+    # Look the model up only once, as it may be evicted concurrently.
+    wrapper = _MODELS.get(model_id)
+    if wrapper is not None:
+        CACHE_HITS.labels("model", os.environ["ENVIRONMENT"], "models").inc()
+    else:
+        CACHE_MISSES.labels("model", os.environ["ENVIRONMENT"], "models").inc()
+        background = app.config["MODEL_BACKGROUND_LOADING"]
+        key, future = _load_model_once(model_id, _request_headers(), background)
+        if not future.done() and background:
+            raise ModelLoading(
+                f"Model {model_id} is being loaded, please retry shortly",
+                app.config["MODEL_LOADING_RETRY_AFTER"],
+            )
+        try:
+            wrapper = future.result()
+        finally:
+            # Failed loads are kept until a caller has seen the error; discard it now
+            # so the next request retries.
+            with _LOADING_LOCK:
+                if _LOADING.get(key) is future:
+                    del _LOADING[key]
     # Enforce access control for non-public cached models.
     if wrapper.project_id is not None:
         jwt_require_claim(wrapper.project_id, "read")
@@ -81,17 +259,35 @@ def get(model_id):
 
 
 def preload_public_models():
-    """Retrieve all public models from storage and instantiate them in memory."""
+    """
+    Retrieve all public models from storage and instantiate them in memory.
+
+    Models are retrieved and deserialized concurrently by a pool of
+    `MODEL_PRELOAD_CONCURRENCY` threads. Progress is logged and exported through the
+    `PRELOADED_MODELS` gauge.
+    """
     logger.info("Preloading all public models (this may take some time)")
-    response = requests.get(f"{app.config['MODEL_STORAGE_API']}/models")
+    response = http_client.get(
+        "model-storage", f"{app.config['MODEL_STORAGE_API']}/models"
+    )
     response.raise_for_status()
-    for model in response.json():
-        _load_model(model["id"])
-    logger.info(f"Done preloading {len(response.json())} models")
+    model_ids = [model["id"] for model in response.json()]
+    environment = os.environ["ENVIRONMENT"]
+    PRELOADED_MODELS.labels("model", environment, "total").set(len(model_ids))
+    with ThreadPoolExecutor(
+        max_workers=app.config["MODEL_PRELOAD_CONCURRENCY"]
+    ) as executor:
+        futures = [executor.submit(_load_model, model_id, {}) for model_id in model_ids]
+        for count, future in enumerate(as_completed(futures), start=1):
+            # Propagate any errors; a failed preload should fail the startup.
+            future.result()
+            PRELOADED_MODELS.labels("model", environment, "done").set(count)
+            logger.info(f"Preloaded {count}/{len(model_ids)} models")
+    logger.info(f"Done preloading {len(model_ids)} models")
 
 
-def _load_model(model_id):
-    logger.debug(f"Requesting model {model_id} from the model warehouse")
+def _request_headers():
+    """Return the headers to forward to the model warehouse for the current request."""
     headers = {}
     # Check g for truthiness; false means there is no request context. This is necessary
     # in the production environment, where models are preloaded outside of any request
@@ -99,8 +295,54 @@ def _load_model(model_id):
     if g and g.jwt_valid:
         logger.debug("Forwarding provided JWT")
         headers["Authorization"] = f"Bearer {g.jwt_token}"
-    response = requests.get(
-        f"{app.config['MODEL_STORAGE_API']}/models/{model_id}", headers=headers
+    return headers
+
+
+def _load_model_once(model_id, headers, background=False):
+    """
+    Load the given model, unless it is already being loaded with the same credentials.
+
+    Returns
+    -------
+    tuple (key, concurrent.futures.Future)
+        The key of the load in `_LOADING`, and the future of the load in progress,
+        resulting in the loaded `ModelWrapper`. If `background` is False and no load
+        was in progress, the model is loaded in the calling thread and the future is
+        done on return.
+    """
+    key = (model_id, headers.get("Authorization"))
+    with _LOADING_LOCK:
+        if key in _LOADING:
+            logger.debug(f"Waiting for model {model_id} to be loaded")
+            return key, _LOADING[key]
+        future = Future()
+        _LOADING[key] = future
+
+    def load():
+        try:
+            wrapper = _load_model(model_id, headers)
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            with _LOADING_LOCK:
+                del _LOADING[key]
+            future.set_result(wrapper)
+
+    if background:
+        _BACKGROUND_LOADER.submit(load)
+    else:
+        load()
+    return key, future
+
+
+def _load_model(model_id, headers):
+    logger.debug(f"Requesting model {model_id} from the model warehouse")
+    start_time = time.time()
+    response = http_client.get(
+        "model-storage",
+        f"{app.config['MODEL_STORAGE_API']}/models/{model_id}",
+        headers=headers,
+        stream=True,
     )
 
     if response.status_code == 401:
@@ -115,13 +357,111 @@ def _load_model(model_id):
         raise ModelNotFound(f"No model with id {model_id}")
     response.raise_for_status()
 
-    logger.debug("Deserializing received model with cobrapy")
-    model_data = response.json()
-    _MODELS[model_id] = ModelWrapper(
-        model_data["id"],
-        model_from_dict(model_data["model_serialized"]),
-        model_data["project_id"],
-        model_data["organism_id"],
-        model_data["default_biomass_reaction"],
-        model_data["ec_model"],
-    )
+    # The response body is spooled to a temporary file rather than kept in memory, and
+    # the model is then built incrementally while parsing it, so that the body, the
+    # parsed document and the model are never all in memory at the same time.
+    with tempfile.TemporaryFile() as body:
+        # The digest of the response body identifies this exact revision of the model;
+        # if the warehouse copy changes, so does the digest and thereby the disk cache
+        # key.
+        digest = hashlib.sha256()
+        for chunk in response.iter_content(_CHUNK_SIZE):
+            digest.update(chunk)
+            body.write(chunk)
+        version = digest.hexdigest()
+        wrapper = _read_cached_model(model_id, version)
+        if wrapper is None:
+            logger.debug("Deserializing received model with cobrapy")
+            body.seek(0)
+            model_data = read_model_document(
+                io.TextIOWrapper(body, encoding="utf-8"), "model_serialized"
+            )
+            wrapper = ModelWrapper(
+                model_data["id"],
+                model_data["model_serialized"],
+                model_data["project_id"],
+                model_data["organism_id"],
+                model_data["default_biomass_reaction"],
+                model_data["ec_model"],
+                version=version,
+            )
+            # Only public models are persisted to disk; proprietary models are kept in
+            # memory only.
+            if wrapper.project_id is None:
+                _write_cached_model(model_id, wrapper)
+    _MODELS[model_id] = wrapper
+    duration = time.time() - start_time
+    MODEL_LOAD_TIME.labels("model", os.environ["ENVIRONMENT"]).observe(duration)
+    logger.info(f"Loaded model {model_id} in {duration:.2f}s")
+    return wrapper
+
+
+def invalidate_cached_model(model_id):
+    """Remove the given model from the in-memory and on-disk caches."""
+    _MODELS.pop(model_id, None)
+    for path in _cached_model_paths(model_id):
+        logger.info(f"Removing cached model snapshot {path}")
+        os.remove(path)
+
+
+def _cache_path(model_id, version):
+    return os.path.join(app.config["MODEL_CACHE_DIR"], f"{model_id}-{version}.pickle")
+
+
+def _cached_model_paths(model_id):
+    """Return paths to all on-disk snapshots of the given model, of any version."""
+    cache_dir = app.config["MODEL_CACHE_DIR"]
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return []
+    return [
+        os.path.join(cache_dir, filename)
+        for filename in os.listdir(cache_dir)
+        if filename.startswith(f"{model_id}-") and filename.endswith(".pickle")
+    ]
+
+
+def _read_cached_model(model_id, version):
+    """Return a model wrapper from the disk cache, or None if not available."""
+    if not app.config["MODEL_CACHE_DIR"]:
+        return None
+    path = _cache_path(model_id, version)
+    if not os.path.exists(path):
+        return None
+    logger.debug(f"Loading model {model_id} from disk cache {path}")
+    try:
+        with open(path, "rb") as file_:
+            data = pickle.load(file_)
+    except Exception as error:
+        # A corrupt or incompatible snapshot (e.g. from a different cobrapy version)
+        # is not fatal; fall back to deserializing the warehouse copy.
+        logger.warning(f"Unable to read cached model snapshot {path}: {error}")
+        return None
+    return ModelWrapper(version=version, **data)
+
+
+def _write_cached_model(model_id, wrapper):
+    """Persist the given model wrapper to the disk cache, replacing old versions."""
+    cache_dir = app.config["MODEL_CACHE_DIR"]
+    if not cache_dir:
+        return
+    data = {
+        "id": wrapper.id,
+        "model": wrapper.model,
+        "project_id": wrapper.project_id,
+        "organism_id": wrapper.organism_id,
+        "biomass_reaction": wrapper.biomass_reaction,
+        "is_ec_model": wrapper.is_ec_model,
+    }
+    path = _cache_path(model_id, wrapper.version)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale_path in _cached_model_paths(model_id):
+            logger.debug(f"Removing outdated model snapshot {stale_path}")
+            os.remove(stale_path)
+        # Write to a temporary file and rename it into place, so that concurrently
+        # starting workers never read a partially written snapshot.
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as file_:
+            pickle.dump(data, file_, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(file_.name, path)
+    except Exception as error:
+        logger.warning(f"Unable to write model snapshot {path}: {error}")
@@ -84,7 +84,7 @@ def e_coli_core(models):
     should be preferred in test cases where possible.
     """
     wrapper = storage._MODELS[models["e_coli_core"]]
-    with wrapper.model as model:
+    with wrapper.checkpoint() as model:
         yield model, wrapper.biomass_reaction, wrapper.is_ec_model
 
 
@@ -96,7 +96,7 @@ def iJO1366(models):
     That means modifications are not persisted beyond the scope of the test function.
     """
     wrapper = storage._MODELS[models["iJO1366"]]
-    with wrapper.model as model:
+    with wrapper.checkpoint() as model:
         yield model, wrapper.biomass_reaction, wrapper.is_ec_model
 
 
@@ -111,5 +111,5 @@ def eciML1515(models):
     (e.g. direct integration of proteomics data).
     """
     wrapper = storage._MODELS[models["eciML1515"]]
-    with wrapper.model as model:
+    with wrapper.checkpoint() as model:
         yield model, wrapper.biomass_reaction, wrapper.is_ec_model
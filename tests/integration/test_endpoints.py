@@ -17,8 +17,9 @@
 from collections import namedtuple
 
 import pytest
-import requests
 
+from simulations import cache, http_client, resources, storage
+from simulations.exceptions import ModelLoading
 from simulations.ice_client import ICE
 
 
@@ -51,15 +52,35 @@ UPTAKE_SECRETION_RATES = [
 
 
 def test_simulate_wrong_id(monkeypatch, client):
-    # Mock `requests` to skip the external API request
+    # Mock `http_client` to skip the external API request
     Response = namedtuple("Response", ["status_code"])
     monkeypatch.setattr(
-        requests, "get", lambda *args, **kwargs: Response(status_code=404)
+        http_client, "get", lambda *args, **kwargs: Response(status_code=404)
     )
     response = client.post("/simulate", json={"model_id": 404, "message": {}})
     assert response.status_code == 404
 
 
+def test_simulate_model_loading(monkeypatch, client):
+    def get(model_id):
+        raise ModelLoading(f"Model {model_id} is being loaded", 5)
+
+    monkeypatch.setattr(storage, "get", get)
+    for url, data in (
+        ("/simulate", {"model_id": 13}),
+        ("/simulate/batch", {"model_id": 13, "scenarios": [{}]}),
+        ("/models/13/modify", {}),
+        (
+            "/community/simulate",
+            {"model_ids": [13], "medium": [], "method": "steadycom"},
+        ),
+    ):
+        response = client.post(url, json=data)
+        assert response.status_code == 202
+        assert response.headers["Retry-After"] == "5"
+        assert response.json["message"] == "Model 13 is being loaded"
+
+
 def test_simulate_unauthorized(client, models):
     response = client.post(
         "/simulate", json={"model_id": models["e_coli_core_proprietary"]}
@@ -388,7 +409,8 @@ def test_modify(monkeypatch, client, models):
         },
     )
     assert response.status_code == 200
-    assert len(response.json["operations"]) == 329
+    # Only exchange reactions with changed bounds are modified by the medium.
+    assert len(response.json["operations"]) == 9
 
 
 def test_prokaryomics_md120_bw25113(client, models):
@@ -643,3 +665,122 @@ def test_growth_rate_measurement(client, models):
     assert response.status_code == 200
     assert response.json["status"] == "optimal"
     assert response.json["growth_rate"] == pytest.approx(0.3)
+
+
+def test_simulate_cached(monkeypatch, client, models):
+    request = {"model_id": models["e_coli_core"], "objective_id": "EX_ac_e"}
+    response = client.post("/simulate", json=request)
+    assert response.status_code == 200
+
+    # Repeated requests must be answered from the cache without simulating.
+    def simulate(*args, **kwargs):
+        raise AssertionError("Simulation should be served from the cache")
+
+    monkeypatch.setattr(resources, "simulate", simulate)
+    cached = client.post("/simulate", json=request)
+    assert cached.status_code == 200
+    assert cached.json == response.json
+
+
+def test_simulate_batch(monkeypatch, client, models):
+    # Disable the result cache to compare the actual simulations.
+    monkeypatch.setattr(cache.SIMULATIONS, "maxsize", 0)
+    scenarios = [
+        {},
+        {"objective_id": "EX_ac_e"},
+        {"operations": [{"operation": "knockout", "type": "reaction", "id": "PGI"}]},
+        {"method": "pfba", "objective_id": "EX_etoh_e", "objective_direction": "max"},
+    ]
+    response = client.post(
+        "/simulate/batch",
+        json={"model_id": models["e_coli_core"], "scenarios": scenarios},
+    )
+    assert response.status_code == 200
+    assert len(response.json) == len(scenarios)
+    # Every scenario gives the same result as its individual simulation request, up to
+    # the numerical differences of starting from another basis.
+    for scenario, result in zip(scenarios, response.json):
+        single = client.post(
+            "/simulate", json={"model_id": models["e_coli_core"], **scenario}
+        ).json
+        assert result["status"] == single["status"]
+        assert result["growth_rate"] == pytest.approx(single["growth_rate"])
+        assert result["flux_distribution"] == pytest.approx(
+            single["flux_distribution"], abs=1e-6
+        )
+
+
+def test_simulate_batch_empty(client, models):
+    response = client.post(
+        "/simulate/batch", json={"model_id": models["e_coli_core"], "scenarios": []}
+    )
+    assert response.status_code == 422
+
+
+def test_simulate_fva_reactions(client, models):
+    response = client.post(
+        "/simulate",
+        json={
+            "model_id": models["e_coli_core"],
+            "method": "fva",
+            "reactions": ["PGI", "PFK"],
+        },
+    )
+    assert response.status_code == 200
+    assert set(response.json["flux_distribution"]) == {
+        "PGI",
+        "PFK",
+        "BIOMASS_Ecoli_core_w_GAM",
+    }
+
+
+def test_simulate_fva_unknown_reactions(client, models):
+    response = client.post(
+        "/simulate",
+        json={
+            "model_id": models["e_coli_core"],
+            "method": "fva",
+            "reactions": ["PGI", "FOO", "BAR"],
+        },
+    )
+    assert response.status_code == 400
+    assert "FOO, BAR" in response.json["message"]
+
+
+def test_modify_medium_cached(monkeypatch, client, models):
+    request = {
+        "medium": [
+            {
+                "name": "glucose",
+                "identifier": "CHEBI:17234",
+                "namespace": "chebi",
+                "mass_concentration": None,
+            },
+            {
+                "name": "ammonium",
+                "identifier": "CHEBI:28938",
+                "namespace": "chebi",
+                "mass_concentration": None,
+            },
+            {
+                "name": "oxygen",
+                "identifier": "CHEBI:15379",
+                "namespace": "chebi",
+                "mass_concentration": None,
+            },
+        ],
+        "fluxomics": FLUXOMICS,
+    }
+    response = client.post(f"/models/{models['e_coli_core']}/modify", json=request)
+    assert response.status_code == 200
+
+    # Applying the same medium again must reuse the cached result, and the subsequent
+    # modifications must be based on the same modified model.
+    def apply_medium(*args, **kwargs):
+        raise AssertionError("Medium should be served from the cache")
+
+    monkeypatch.setattr(resources, "apply_medium", apply_medium)
+    request["medium"].reverse()
+    cached = client.post(f"/models/{models['e_coli_core']}/modify", json=request)
+    assert cached.status_code == 200
+    assert cached.json == response.json
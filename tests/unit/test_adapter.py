@@ -27,7 +27,14 @@ def test_medium_salts():
     assert len(SALTS) > 2000
     assert len(SALTS["CHEBI:75832"]["ions"]) == 2
     assert len(SALTS["CHEBI:30808"]["metals"]) == 7
-    assert len(SALTS["CHEBI:86254"]["ions"]) == 2
+    # The nested salt CHEBI:30808 is decomposed into its metals.
+    assert SALTS["CHEBI:86254"]["ions"] == ["CHEBI:15377"]
+    assert set(SALTS["CHEBI:30808"]["metals"]) <= set(SALTS["CHEBI:86254"]["metals"])
+    assert not any(
+        identifier in SALTS
+        for salt in SALTS.values()
+        for identifier in salt["ions"] + salt["metals"]
+    )
 
 
 def test_medium_adapter(iJO1366):
@@ -57,6 +64,21 @@ def test_medium_adapter(iJO1366):
     assert all(
         iJO1366.reactions.get_by_id(r).lower_bound == -1000 for r in iJO1366.medium
     )
+    # Operations are only returned for the exchange reactions whose bounds changed,
+    # such as the closed glucose uptake of the default medium.
+    assert 0 < len(operations) < len(iJO1366.exchanges)
+    assert "EX_glc__D_e" in {operation["id"] for operation in operations}
+
+
+def test_medium_adapter_forced_secretion(iJO1366):
+    iJO1366, biomass_reaction, is_ec_model = iJO1366
+    iJO1366.reactions.EX_ac_e.bounds = (1, 1000)
+    medium = [{"name": "Foo", "identifier": "CHEBI:63041", "namespace": "chebi"}]
+    operations, warnings, errors = apply_medium(iJO1366, is_ec_model, medium)
+    # Like `model.medium`, only exchange reactions permitting uptake are closed.
+    assert iJO1366.reactions.EX_ac_e.bounds == (1, 1000)
+    assert "EX_ac_e" not in {operation["id"] for operation in operations}
+    assert iJO1366.reactions.EX_glc__D_e.bounds == (0, 1000)
 
 
 def test_medium_adapter_ec_model(eciML1515):
@@ -0,0 +1,81 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+from simulations import cache, storage
+
+
+def test_lru_eviction(app):
+    evicted = []
+    lru = cache.LRUCache(
+        "test", 3, on_evict=lambda key, value: evicted.append((key, value))
+    )
+    for key in "abc":
+        lru.set(key, key.upper())
+    # Mark 'a' as recently used, leaving 'b' as the eviction candidate.
+    assert lru.get("a") == "A"
+    lru.set("d", "D")
+    assert "b" not in lru
+    assert evicted == [("b", "B")]
+    assert len(lru) == 3
+    assert lru.get("b") is None
+
+
+def test_lru_sizeof(app):
+    lru = cache.LRUCache("test", 10, sizeof=len)
+    lru.set("a", b"12345")
+    lru.set("b", b"123456")
+    assert "a" not in lru
+    assert lru.size == 6
+    # Values larger than the whole cache are not cached at all.
+    lru.set("c", b"12345678901")
+    assert "c" not in lru
+    assert "b" in lru
+
+
+def test_lru_ttl(app):
+    lru = cache.LRUCache("test", 10, ttl=0.05)
+    lru.set("a", "A")
+    assert lru.get("a") == "A"
+    time.sleep(0.1)
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_lru_disk_tier(app, tmp_path):
+    lru = cache.LRUCache("test", 10, sizeof=len, directory=str(tmp_path))
+    lru.set("a", b"result")
+    lru.clear()
+    assert lru.get("a") == b"result"
+    assert "a" in lru
+    # Another cache, e.g. in another worker process, shares the entries.
+    assert cache.LRUCache("test", 10, directory=str(tmp_path)).get("a") == b"result"
+
+
+def test_simulation_key(models):
+    wrapper = storage._MODELS[models["e_coli_core"]]
+    operations = [
+        {"operation": "knockout", "type": "gene", "id": "b1", "data": None},
+        {"operation": "knockout", "type": "gene", "id": "b2", "data": None},
+    ]
+    key = cache.simulation_key(wrapper, method="fba", operations=operations)
+    reordered_fields = [dict(reversed(list(op.items()))) for op in operations]
+    assert key == cache.simulation_key(
+        wrapper, operations=reordered_fields, method="fba"
+    )
+    assert key != cache.simulation_key(
+        wrapper, method="fba", operations=list(reversed(operations))
+    )
+    assert key != cache.simulation_key(wrapper, method="pfba", operations=operations)
@@ -14,8 +14,17 @@
 
 import pytest
 
-from simulations.exceptions import MetaboliteNotFound
-from simulations.modeling.cobra_helpers import find_metabolite
+from simulations.exceptions import MetaboliteNotFound, ReactionNotFound
+from simulations.modeling.cobra_helpers import (
+    checkpoint,
+    find_genes,
+    find_metabolite,
+    find_reaction,
+    get_exchange_reaction,
+    index_proteins,
+    set_bounds,
+)
+from simulations.modeling.operations import apply_operations
 
 
 def test_existing_metabolite(iJO1366):
@@ -26,3 +35,158 @@ def test_existing_metabolite(iJO1366):
     assert find_metabolite(iJO1366, "succ", "bigg.metabolite", "e").formula == "C4H4O4"
     with pytest.raises(MetaboliteNotFound):
         find_metabolite(iJO1366, "wrong_id", "wrong_namespace", "e")
+
+
+def test_find_reaction(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    assert find_reaction(e_coli_core, "pgi", "bigg.reaction").id == "PGI"
+    with pytest.raises(ReactionNotFound):
+        find_reaction(e_coli_core, "FOO", "bigg.reaction")
+
+
+def test_index_invalidation(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    with pytest.raises(ReactionNotFound):
+        find_reaction(e_coli_core, "FOO", "bigg.reaction")
+    with e_coli_core:
+        apply_operations(
+            e_coli_core,
+            [
+                {
+                    "operation": "add",
+                    "type": "reaction",
+                    "data": {
+                        "id": "FOO",
+                        "name": "foo",
+                        "lower_bound": 0,
+                        "upper_bound": 1000,
+                        "metabolites": {"foo_e": -1, "pyr_e": 1},
+                    },
+                }
+            ],
+        )
+        assert find_reaction(e_coli_core, "foo", "bigg.reaction").id == "FOO"
+        assert find_metabolite(e_coli_core, "foo", "bigg.metabolite", "e").id == "foo_e"
+    # The addition is reverted on leaving the context, and so is the index.
+    with pytest.raises(ReactionNotFound):
+        find_reaction(e_coli_core, "FOO", "bigg.reaction")
+    with pytest.raises(MetaboliteNotFound):
+        find_metabolite(e_coli_core, "foo", "bigg.metabolite", "e")
+
+
+def test_get_exchange_reaction(e_coli_core, eciML1515):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    glucose = e_coli_core.metabolites.get_by_id("glc__D_e")
+    assert get_exchange_reaction(glucose).id == "EX_glc__D_e"
+    with pytest.raises(ValueError):
+        get_exchange_reaction(e_coli_core.metabolites.get_by_id("g6p_c"))
+
+    eciML1515, biomass_reaction, is_ec_model = eciML1515
+    g6p = next(m for m in eciML1515.metabolites if m.id.startswith("g6p_e"))
+    consumption = get_exchange_reaction(g6p, True, consumption=True)
+    production = get_exchange_reaction(g6p, True, consumption=False)
+    assert consumption.products == [g6p]
+    assert production.reactants == [g6p]
+    with pytest.raises(TypeError):
+        get_exchange_reaction(g6p, True)
+
+
+def test_find_genes(iJO1366):
+    iJO1366, biomass_reaction, is_ec_model = iJO1366
+    assert [g.id for g in find_genes(iJO1366, "b1241")] == ["b1241"]
+    assert [g.id for g in find_genes(iJO1366, "adhE")] == ["b1241"]
+    assert find_genes(iJO1366, "AdhE") == []
+    assert [g.id for g in find_genes(iJO1366, "AdhE", ignore_case=True)] == ["b1241"]
+    assert find_genes(iJO1366, "B1241", ignore_case=True) == []
+
+
+def test_index_proteins(eciML1515):
+    eciML1515, biomass_reaction, is_ec_model = eciML1515
+    proteins = index_proteins(eciML1515)
+    assert "P0AFG8" in proteins and "b0114" not in proteins
+    positions = proteins.positions(["P15254", "unknown", "P0AFG8"])
+    assert positions[1] == -1
+    exchanges = proteins.exchanges(eciML1515, positions[[0, 2]])
+    assert [r.id for r in exchanges] == ["prot_P15254_exchange", "prot_P0AFG8_exchange"]
+    assert list(proteins.metabolite_ids[positions[[0, 2]]]) == [
+        "prot_P15254[c]",
+        "prot_P0AFG8[c]",
+    ]
+    # The proteins are in the order of their metabolites in the model.
+    metabolites = [eciML1515.metabolites.index(id) for id in proteins.metabolite_ids]
+    assert metabolites == sorted(metabolites)
+
+    proteins.limit(eciML1515, positions[[0, 2]], [1e-6, 1e-3])
+    assert [r.bounds for r in exchanges] == [(0, 1e-6), (0, 1e-3)]
+
+
+def test_set_bounds(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    cs, pgi = e_coli_core.reactions.CS, e_coli_core.reactions.PGI
+    with e_coli_core as model:
+        set_bounds(model, {cs: (-20, 20), pgi: pgi.bounds})
+        assert cs.bounds == (-20, 20)
+        assert (cs.reverse_variable.ub, cs.forward_variable.ub) == (20, 20)
+        # A single entry restores all changed bounds.
+        assert len(model._contexts[-1]._history) == 1
+        with pytest.raises(ValueError):
+            set_bounds(model, {pgi: (0, 0), cs: (10, -10)})
+        assert pgi.bounds != (0, 0)
+    assert cs.bounds == (0, 1000)
+    assert (cs.reverse_variable.ub, cs.forward_variable.ub) == (0, 1000)
+
+
+def test_checkpoint(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    bounds = {r.id: r.bounds for r in e_coli_core.reactions}
+    cs, pgi = e_coli_core.reactions.CS, e_coli_core.reactions.PGI
+    with checkpoint(e_coli_core) as model:
+        set_bounds(model, {cs: (-20, 20), pgi: (0, 0)})
+        # The checkpoint restores the bounds rather than the model context.
+        assert len(model._contexts[-1]._history) == 0
+        model.remove_reactions([pgi])
+        with model:
+            set_bounds(model, {cs: (-30, 30)})
+            assert len(model._contexts[-1]._history) == 1
+        assert cs.bounds == (-20, 20)
+        cs.bounds = (1, 2)
+        set_bounds(model, {cs: (3, 4)})
+    assert {r.id: r.bounds for r in e_coli_core.reactions} == bounds
+    assert (cs.reverse_variable.ub, cs.forward_variable.ub) == (0, 1000)
+    pgi = e_coli_core.reactions.PGI
+    assert (pgi.reverse_variable.ub, pgi.forward_variable.ub) == (1000, 1000)
+
+
+def test_apply_operations_undo(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    bounds = {r.id: r.bounds for r in e_coli_core.reactions}
+    with e_coli_core as model:
+        apply_operations(
+            model,
+            [
+                {
+                    "operation": "modify",
+                    "type": "reaction",
+                    "id": reaction_id,
+                    "data": {"id": reaction_id, "lower_bound": -5, "upper_bound": 5},
+                }
+                for reaction_id in ("CS", "PGI", "EX_glc__D_e")
+            ],
+        )
+        apply_operations(
+            model,
+            [
+                {"operation": "knockout", "type": "gene", "id": "b4025"},
+                {"operation": "remove", "type": "reaction", "id": "PGI"},
+            ],
+        )
+        model.objective = "CS"
+        assert model.reactions.EX_glc__D_e.bounds == (-5, 5)
+    assert {r.id: r.bounds for r in e_coli_core.reactions} == bounds
+    pgi = e_coli_core.reactions.PGI
+    assert (pgi.reverse_variable.ub, pgi.forward_variable.ub) == (1000, 1000)
+    assert e_coli_core.reactions.EX_glc__D_e.reverse_variable.ub == 10
+    assert e_coli_core.genes.b4025.functional
+    assert e_coli_core.objective.expression.has(
+        e_coli_core.reactions.get_by_id(biomass_reaction).forward_variable
+    )
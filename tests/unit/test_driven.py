@@ -12,11 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
+import weakref
+
 import numpy as np
 import pandas as pd
 import pytest
+from cobra.io import read_sbml_model
 
 from simulations.modeling.driven import (
+    _FITTING_PROBLEMS,
     adjust_fluxes2model,
     flexibilize_proteomics,
     minimize_distance,
@@ -258,6 +263,23 @@ def test_flexibilize_proteins(eciML1515):
     assert len(warnings) == 2
 
 
+def test_flexibilize_proteins_per_iteration(eciML1515):
+    eciML1515, biomass_reaction, is_ec_model = eciML1515
+    proteomics = [
+        {"identifier": "P0AFG8", "measurement": 8.2e-3, "uncertainty": 8.2e-6},
+        {"identifier": "P15254", "measurement": 6.54e-8, "uncertainty": 0},
+        {"identifier": "P0A6C5", "measurement": 5.93e-8, "uncertainty": 0},
+    ]
+    growth_rate = {"measurement": 0.1, "uncertainty": 0.01}
+    growth_rate, proteomics, warnings = flexibilize_proteomics(
+        eciML1515, biomass_reaction, growth_rate, proteomics, [], 3
+    )
+    # all proteins are removed in a single iteration, including the unnecessary one:
+    assert proteomics == []
+    assert len(warnings) == 3
+    assert eciML1515.reactions.prot_P0AFG8_exchange.upper_bound == 1000
+
+
 def test_flexibilize_proteins_skip(eciML1515):
     # skip flexibilization due to unmatched rate -> keep proteomics unaltered
     eciML1515, biomass_reaction, is_ec_model = eciML1515
@@ -289,3 +311,58 @@ def test_flexibilize_proteins_skip(eciML1515):
     # no flexibilization should have occurred:
     assert len(proteomics) == 2
     assert len(warnings) == 0
+
+
+def test_adjust_fluxes2model_formulations(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    e_coli_core.reactions.get_by_id(biomass_reaction).bounds = 0.5, 0.5
+    # CS and ATPM are irreversible, so their observed directions are irrelevant.
+    observations = pd.Series({"CS": -3.0, "ATPM": 100.0, "PGI": -4.0})
+
+    milp = adjust_fluxes2model(e_coli_core, observations, formulation="milp")
+    auto = adjust_fluxes2model(e_coli_core, observations)
+    assert auto.objective_value == pytest.approx(milp.objective_value)
+    # Trusting the sign of the PGI observation cannot result in a smaller distance.
+    lp = adjust_fluxes2model(e_coli_core, observations, formulation="lp")
+    assert lp.objective_value > milp.objective_value
+    assert lp.fluxes["PGI"] == pytest.approx(-4.0)
+
+    with pytest.raises(ValueError):
+        adjust_fluxes2model(e_coli_core, observations, formulation="foo")
+
+
+def test_adjust_fluxes2model_reuse(e_coli_core, monkeypatch):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    growth_rate = e_coli_core.slim_optimize()
+    size = len(e_coli_core.variables), len(e_coli_core.constraints)
+    # ACALD and GAPD are reversible, so their directions are chosen by binary variables.
+    observations = pd.Series({"CS": 3.0, "ATPM": 100.0, "GAPD": -4.0, "ACALD": -1.0})
+
+    adjust_fluxes2model(e_coli_core, observations)
+    problems = len(_FITTING_PROBLEMS[e_coli_core])
+    # The problem is only part of the solver while fitting.
+    assert not e_coli_core.solver.is_integer
+    assert (len(e_coli_core.variables), len(e_coli_core.constraints)) == size
+    # The problem is reused for new observations of the same reactions.
+    solution = adjust_fluxes2model(e_coli_core, observations * 2)
+    assert len(_FITTING_PROBLEMS[e_coli_core]) == problems
+    assert not e_coli_core.solver.is_integer
+    assert (len(e_coli_core.variables), len(e_coli_core.constraints)) == size
+    expected = adjust_fluxes2model(e_coli_core, observations * 2, formulation="milp")
+    assert solution.objective_value == pytest.approx(expected.objective_value)
+
+    monkeypatch.setattr(_FITTING_PROBLEMS[e_coli_core], "maxsize", 1)
+    adjust_fluxes2model(e_coli_core, observations, formulation="lp")
+    assert len(_FITTING_PROBLEMS[e_coli_core]) == 1
+    assert e_coli_core.slim_optimize() == pytest.approx(growth_rate)
+
+
+def test_adjust_fluxes2model_model_collected():
+    model = read_sbml_model("tests/data/e_coli_core.xml.gz")
+    adjust_fluxes2model(model, pd.Series({"CS": 3.0, "ACALD": -1.0}))
+    assert model in _FITTING_PROBLEMS
+    reference = weakref.ref(model)
+    del model
+    gc.collect()
+    # The cached problems don't keep the model alive.
+    assert reference() is None
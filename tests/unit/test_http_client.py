@@ -0,0 +1,68 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+
+import prometheus_client
+import requests
+
+from simulations import http_client
+
+
+def test_session_is_reused(app):
+    session = http_client.session("model-storage")
+    assert http_client.session("model-storage") is session
+    assert http_client.session("id-mapper") is not session
+    adapter = session.get_adapter(app.config["MODEL_STORAGE_API"])
+    assert adapter.max_retries.total == app.config["HTTP_RETRIES"]
+
+
+def test_request_default_timeout(monkeypatch, app):
+    calls = []
+
+    def request(self, method, url, **kwargs):
+        calls.append(kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    http_client.get("model-storage", f"{app.config['MODEL_STORAGE_API']}/models")
+    http_client.get("model-storage", "http://example.com", timeout=1)
+    assert calls[0]["timeout"] == (
+        app.config["HTTP_CONNECT_TIMEOUT"],
+        app.config["HTTP_READ_TIMEOUT"],
+    )
+    assert calls[1]["timeout"] == 1
+
+
+def test_streamed_request_timed_until_body_read(monkeypatch, app):
+    observed = []
+
+    def request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(b"model" * 1024)
+        return response
+
+    def observe(self, amount):
+        observed.append(amount)
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    monkeypatch.setattr(prometheus_client.Histogram, "observe", observe)
+    response = http_client.get(
+        "model-storage", f"{app.config['MODEL_STORAGE_API']}/models/1", stream=True
+    )
+    assert observed == []
+    assert b"".join(response.iter_content(1024)) == b"model" * 1024
+    assert len(observed) == 1
+    response.close()
+    assert len(observed) == 1
@@ -105,3 +105,38 @@ def test_knockout_gene(e_coli_core):
     )
     assert not e_coli_core.genes.b4025.functional
     assert all([r.bounds == (0.0, 0.0) for r in e_coli_core.genes.b4025.reactions])
+
+
+def test_bound_changes_reverted(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    bounds = {r.id: r.bounds for r in e_coli_core.reactions}
+    with e_coli_core:
+        apply_operations(
+            e_coli_core,
+            [
+                {"operation": "knockout", "type": "reaction", "id": "CS"},
+                {
+                    "operation": "modify",
+                    "type": "reaction",
+                    "id": "CS",
+                    "data": {"id": "CS", "lower_bound": -20.0, "upper_bound": 20.0},
+                },
+                {"operation": "knockout", "type": "gene", "id": "b4025"},
+                {"operation": "remove", "type": "reaction", "id": "PGI"},
+                {
+                    "operation": "modify",
+                    "type": "reaction",
+                    "id": "EX_glc__D_e",
+                    "data": {"id": "EX_glc__D_e", "lower_bound": -5, "upper_bound": 0},
+                },
+            ],
+        )
+        # The last change of each reaction wins.
+        assert e_coli_core.reactions.CS.bounds == (-20.0, 20.0)
+        assert e_coli_core.reactions.EX_glc__D_e.bounds == (-5, 0)
+        assert e_coli_core.reactions.EX_glc__D_e.forward_variable.ub == 0
+        assert e_coli_core.reactions.EX_glc__D_e.reverse_variable.ub == 5
+        assert not e_coli_core.reactions.has_id("PGI")
+    assert {r.id: r.bounds for r in e_coli_core.reactions} == bounds
+    assert e_coli_core.genes.b4025.functional
+    assert e_coli_core.reactions.EX_glc__D_e.reverse_variable.ub == 10
@@ -12,7 +12,92 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from simulations.modeling.reframed_helpers import generate_transactions
+import tempfile
+import warnings
+
+import cobra
+import pytest
+import reframed
+
+from simulations.modeling import reframed_helpers
+from simulations.modeling.reframed_helpers import generate_transactions, to_reframed
+
+
+def describe(rf_model):
+    """Return the parts of a reframed model, and the metadata of each part."""
+    parts = {
+        "id": rf_model.id,
+        "compartments": [
+            (c.id, c.name, c.external, c.size) for c in rf_model.compartments.values()
+        ],
+        "metabolites": [
+            (m.id, m.name, m.compartment) for m in rf_model.metabolites.values()
+        ],
+        "reactions": [
+            (
+                r.id,
+                r.name,
+                r.reversible,
+                list(r.stoichiometry.items()),
+                r.regulators,
+                r.lb,
+                r.ub,
+                r.objective,
+                str(r.gpr),
+                r.reaction_type,
+            )
+            for r in rf_model.reactions.values()
+        ],
+        "genes": [(g.id, g.name) for g in rf_model.genes.values()],
+    }
+    groups = (rf_model.compartments, rf_model.metabolites, rf_model.reactions)
+    metadata = [element.metadata for group in groups for element in group.values()]
+    return parts, metadata
+
+
+@pytest.mark.parametrize("fixture", ["e_coli_core", "iJO1366"])
+def test_to_reframed(fixture, request):
+    model, biomass_reaction, is_ec_model = request.getfixturevalue(fixture)
+    model.metabolites[0].notes = {"KEGG": "C00001", "key: with colon": 1}
+    model.reactions[0].notes = {"SUBSYSTEM": " Glycolysis "}
+    with tempfile.NamedTemporaryFile() as file_:
+        cobra.io.write_sbml_model(model, file_.name)
+        expected_parts, expected_metadata = describe(
+            reframed.load_cbmodel(file_.name, flavor="bigg")
+        )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        parts, metadata = describe(to_reframed(model))
+    assert parts == expected_parts
+    # Newer versions of reframed also read annotations into the metadata.
+    for items, expected_items in zip(metadata, expected_metadata):
+        assert items.items() <= expected_items.items()
+    assert metadata[len(model.compartments)] == {
+        "FORMULA": model.metabolites[0].formula,
+        "CHARGE": str(model.metabolites[0].charge),
+        "KEGG": "C00001",
+        "key": "with colon: 1",
+    }
+
+
+def test_to_reframed_gpr(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    e_coli_core.reactions.PFK.gene_reaction_rule = "b3916 or (b1723 or b1241)"
+    e_coli_core.reactions.PGI.gene_reaction_rule = "(b4025 or b1241) and b1723"
+    with pytest.warns(UserWarning, match="reaction R_PGI is not DNF"):
+        rf_model = to_reframed(e_coli_core)
+    # Nested associations of the same kind are flattened.
+    assert str(rf_model.reactions.R_PFK.gpr) == "(G_b3916 or G_b1723 or G_b1241)"
+    assert rf_model.reactions.R_PGI.gpr is None
+    assert str(rf_model.reactions.R_ACKr.gpr) == "(G_b3115 or G_b2296 or G_b1849)"
+
+
+def test_to_reframed_without_sbml_helpers(monkeypatch, e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    expected_parts, _ = describe(to_reframed(e_coli_core))
+    monkeypatch.setattr(reframed_helpers, "_SBML_HELPERS", False)
+    parts, _ = describe(to_reframed(e_coli_core))
+    assert parts == expected_parts
 
 
 def test_generate_transactions_uptake():
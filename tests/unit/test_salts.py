@@ -0,0 +1,54 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from simulations.modeling.adapter import SALTS
+from simulations.modeling.salts import SaltsIndex, write_index
+
+
+def test_salts_index(tmp_path):
+    salts = {
+        "CHEBI:2": {
+            "ions": ["CHEBI:10", "CHEBI:1"],
+            "ions_missing_smiles": ["[Na+]"],
+            "metals": [],
+            "metals_missing_inchi": [],
+        },
+        "CHEBI:1": {
+            "ions": [],
+            "ions_missing_smiles": [],
+            "metals": ["CHEBI:10"],
+            "metals_missing_inchi": ["Zn"],
+        },
+    }
+    path = str(tmp_path / "salts.idx")
+    write_index(salts, path)
+    index = SaltsIndex(path)
+    assert len(index) == 2
+    assert list(index) == ["CHEBI:1", "CHEBI:2"]
+    assert index["CHEBI:2"] == salts["CHEBI:2"]
+    assert index["CHEBI:1"] == salts["CHEBI:1"]
+    assert "CHEBI:3" not in index
+    assert None not in index
+    with pytest.raises(KeyError):
+        index["CHEBI:3"]
+
+
+def test_salts_index_matches_json():
+    with open("data/salts.json") as file_:
+        salts = json.load(file_)
+    assert dict(SALTS) == salts
@@ -0,0 +1,60 @@
+# Copyright 2018 Novo Nordisk Foundation Center for Biosustainability, DTU.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+
+import pytest
+from cobra.io.dict import model_to_dict
+
+from simulations.modeling.serialization import JSONStreamReader, read_model_document
+
+
+def test_stream_reader():
+    document = '{"a": [1, 2.5e3, {"b": null}], "c": "d\\"e", "f": [], "g": {}}'
+    reader = JSONStreamReader(io.StringIO(document), chunk_size=3)
+    keys = reader.keys()
+    assert next(keys) == "a"
+    assert list(reader.items()) == [1, 2500.0, {"b": None}]
+    assert next(keys) == "c"
+    assert reader.value() == 'd"e'
+    assert next(keys) == "f"
+    assert list(reader.items()) == []
+    assert next(keys) == "g"
+    assert reader.value() == {}
+    assert list(keys) == []
+    assert reader.at_end()
+
+
+def test_read_model_document(e_coli_core):
+    model, biomass_reaction, is_ec_model = e_coli_core
+    serialized = model_to_dict(model)
+    # Let reactions precede the metabolites they reference, as in documents with keys
+    # sorted differently than by cobrapy.
+    serialized = {
+        key: serialized[key]
+        for key in sorted(serialized, key=lambda key: key != "reactions")
+    }
+    document = json.dumps({"id": 1, "model_serialized": serialized, "ec_model": False})
+    result = read_model_document(io.StringIO(document), "model_serialized", 100)
+    assert result["id"] == 1
+    assert result["ec_model"] is False
+    assert model_to_dict(result["model_serialized"]) == model_to_dict(model)
+
+
+def test_read_model_document_invalid():
+    with pytest.raises(ValueError):
+        read_model_document(io.StringIO('{"model": {"reactions": [}}'), "model")
+    with pytest.raises(ValueError):
+        read_model_document(io.StringIO('{"model": {"genes": []}}'), "model")
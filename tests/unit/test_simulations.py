@@ -14,6 +14,7 @@
 
 import pytest
 
+from simulations.exceptions import ReactionNotFound
 from simulations.modeling.simulations import METHODS, simulate
 
 
@@ -35,3 +36,36 @@ def test_simulation_methods(e_coli_core, method):
     if method not in {"fva", "pfba-fva"}:
         reactions_ids = [i.id for i in e_coli_core.reactions]
         assert set(fluxes) == set(reactions_ids)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_fva_reaction_subset(monkeypatch, app, e_coli_core, processes):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    monkeypatch.setitem(app.config, "FVA_PROCESSES", processes)
+    for reaction_id in ("CS", "ACONTa", "ACONTb"):
+        reaction = e_coli_core.reactions.get_by_id(reaction_id)
+        monkeypatch.setattr(reaction, "subsystem", "Citric Acid Cycle")
+    # The analysis, also in forked processes, uses the modified model.
+    e_coli_core.reactions.PGI.knock_out()
+    fluxes, growth_rate = simulate(
+        e_coli_core,
+        biomass_reaction,
+        "fva",
+        None,
+        None,
+        reactions=["PGI"],
+        exchanges_only=True,
+        subsystems=["Citric Acid Cycle"],
+    )
+    expected = {"PGI", biomass_reaction}
+    expected.update(reaction.id for reaction in e_coli_core.exchanges)
+    expected.update(("CS", "ACONTa", "ACONTb"))
+    assert set(fluxes) == expected
+    assert fluxes["PGI"] == {"lower_bound": 0, "upper_bound": 0}
+    assert growth_rate == pytest.approx(0.8631, abs=1e-4)
+
+
+def test_fva_unknown_reactions(e_coli_core):
+    e_coli_core, biomass_reaction, is_ec_model = e_coli_core
+    with pytest.raises(ReactionNotFound, match="FOO"):
+        simulate(e_coli_core, biomass_reaction, "fva", None, None, reactions=["FOO"])
@@ -12,13 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
+import json
+import threading
+import time
+import weakref
+
 import pytest
-import requests
 from cobra import Model
+from cobra.io import read_sbml_model
 from flask import g
 
-from simulations import storage
-from simulations.exceptions import Forbidden, Unauthorized
+from simulations import http_client, storage
+from simulations.exceptions import Forbidden, ModelLoading, Unauthorized
+from simulations.modeling.cobra_helpers import (
+    find_metabolite,
+    find_reaction,
+    get_exchange_reaction,
+    get_exchanges,
+    set_bounds,
+)
 
 
 class MockResponseSuccess:
@@ -41,6 +54,21 @@ class MockResponseSuccess:
             "ec_model": False,
         }
 
+    def iter_content(self, chunk_size):
+        content = json.dumps(self.json()).encode()
+        for start in range(0, len(content), chunk_size):
+            yield content[start : start + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+
+class MockResponseModelList:
+    status_code = 200
+
+    def json(self):
+        return [{"id": 13}, {"id": 14}, {"id": 15}]
+
     def raise_for_status(self):
         pass
 
@@ -60,13 +88,36 @@ class MockResponseForbidden:
 
 
 def test_get_model(monkeypatch, app):
-    monkeypatch.setattr(requests, "get", lambda url, headers: MockResponseSuccess())
+    monkeypatch.setattr(
+        http_client, "get", lambda api_name, url, headers, stream: MockResponseSuccess()
+    )
     g.jwt_valid = False
     assert type(storage.get(10).model) == Model
 
 
+def test_get_model_evicted_after_loading(monkeypatch, app):
+    load_model = storage._load_model
+
+    def evicting_load_model(model_id, headers):
+        wrapper = load_model(model_id, headers)
+        # Another thread evicts the model before the caller looks it up.
+        storage._MODELS.pop(model_id)
+        return wrapper
+
+    monkeypatch.setattr(
+        http_client, "get", lambda api_name, url, headers, stream: MockResponseSuccess()
+    )
+    monkeypatch.setattr(storage, "_load_model", evicting_load_model)
+    g.jwt_valid = False
+    assert type(storage.get(18).model) == Model
+
+
 def test_get_model_forbidden(monkeypatch, app):
-    monkeypatch.setattr(requests, "get", lambda url, headers: MockResponseForbidden())
+    monkeypatch.setattr(
+        http_client,
+        "get",
+        lambda api_name, url, headers, stream: MockResponseForbidden(),
+    )
     g.jwt_valid = False
     with pytest.raises(Forbidden):
         storage.get(11)
@@ -74,8 +125,132 @@ def test_get_model_forbidden(monkeypatch, app):
 
 def test_get_model_unauthorized(monkeypatch, app):
     monkeypatch.setattr(
-        requests, "get", lambda url, headers: MockResponseUnauthorized()
+        http_client,
+        "get",
+        lambda api_name, url, headers, stream: MockResponseUnauthorized(),
     )
     g.jwt_valid = False
     with pytest.raises(Unauthorized):
         storage.get(11)
+
+
+def test_preload_public_models(monkeypatch, app):
+    def get(api_name, url, headers=None, stream=False):
+        if url.endswith("/models"):
+            return MockResponseModelList()
+        return MockResponseSuccess()
+
+    monkeypatch.setattr(http_client, "get", get)
+    storage.preload_public_models()
+    assert all(model_id in storage._MODELS for model_id in (13, 14, 15))
+
+
+def test_get_model_disk_cache(monkeypatch, app, tmp_path):
+    monkeypatch.setitem(app.config, "MODEL_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(
+        http_client, "get", lambda api_name, url, headers, stream: MockResponseSuccess()
+    )
+    g.jwt_valid = False
+    storage.get(12)
+    assert len(list(tmp_path.glob("12-*.pickle"))) == 1
+
+    # Reloading the same model version should not deserialize it again.
+    def read_model_document(file_, model_key):
+        raise AssertionError("Model should be loaded from the disk cache")
+
+    monkeypatch.setattr(storage, "read_model_document", read_model_document)
+    del storage._MODELS[12]
+    assert type(storage.get(12).model) == Model
+
+    storage.invalidate_cached_model(12)
+    assert 12 not in storage._MODELS
+    assert not list(tmp_path.glob("12-*.pickle"))
+
+
+def test_model_cache_eviction(monkeypatch, app):
+    monkeypatch.setattr(storage, "estimate_size", lambda wrapper: 10)
+    monkeypatch.setitem(app.config, "MODEL_MEMORY_BUDGET", 35)
+    cache = storage.ModelCache()
+    cache[1] = storage.ModelWrapper(1, Model("public"), None, 1, "foo", False)
+    cache[2] = storage.ModelWrapper(2, Model("proprietary1"), 1, 1, "foo", False)
+    cache[3] = storage.ModelWrapper(3, Model("proprietary2"), 1, 1, "foo", False)
+    # Mark model 2 as recently used, leaving model 3 as the eviction candidate.
+    cache[2]
+    cache[4] = storage.ModelWrapper(4, Model("proprietary3"), 1, 1, "foo", False)
+    assert 1 in cache
+    assert 2 in cache
+    assert 3 not in cache
+    assert 4 in cache
+    assert cache.size == 30
+
+
+def test_model_cache_eviction_collects_model(monkeypatch, app):
+    monkeypatch.setattr(storage, "estimate_size", lambda wrapper: 10)
+    monkeypatch.setitem(app.config, "MODEL_MEMORY_BUDGET", 15)
+    cache = storage.ModelCache()
+    model = read_sbml_model("tests/data/e_coli_core.xml.gz")
+    cache[1] = storage.ModelWrapper(1, model, 1, 1, "BIOMASS_Ecoli_core_w_GAM", False)
+    # Build all indices of the model.
+    find_reaction(model, "PGI", "bigg.reaction")
+    get_exchange_reaction(find_metabolite(model, "glc__D", "bigg.metabolite", "e"))
+    get_exchanges(model)
+    reference = weakref.ref(model)
+    del model
+    cache[2] = storage.ModelWrapper(2, Model("proprietary"), 1, 1, "foo", False)
+    assert 1 not in cache
+    gc.collect()
+    assert reference() is None
+
+
+def test_model_wrapper_checkpoint(models):
+    wrapper = storage._MODELS[models["e_coli_core"]]
+    bounds = {r.id: r.bounds for r in wrapper.model.reactions}
+    with wrapper.checkpoint() as model:
+        cs, pgk = model.reactions.CS, model.reactions.PGK
+        # Mix bounds set with setters and with `set_bounds` on the same reactions.
+        pgk.bounds = (-5, 5)
+        set_bounds(model, {cs: (0, 1), pgk: (0, 1)})
+        pgk.knock_out()
+        set_bounds(model, {pgk: (0, 2)})
+        cs.bounds = (0, 3)
+        assert (cs.bounds, pgk.bounds) == ((0, 3), (0, 2))
+    assert {r.id: r.bounds for r in wrapper.model.reactions} == bounds
+    assert (pgk.reverse_variable.ub, pgk.forward_variable.ub) == (1000, 1000)
+
+
+def test_get_model_single_flight(monkeypatch, app):
+    requested = []
+
+    def get(api_name, url, headers, stream):
+        requested.append(url)
+        time.sleep(0.1)
+        return MockResponseSuccess()
+
+    monkeypatch.setattr(http_client, "get", get)
+    threads = [threading.Thread(target=storage.get, args=(16,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(requested) == 1
+    assert 16 in storage._MODELS
+
+
+def test_get_model_background_loading(monkeypatch, app):
+    monkeypatch.setitem(app.config, "MODEL_BACKGROUND_LOADING", True)
+    released = threading.Event()
+
+    def get(api_name, url, headers, stream):
+        released.wait()
+        return MockResponseSuccess()
+
+    monkeypatch.setattr(http_client, "get", get)
+    g.jwt_valid = False
+    with pytest.raises(ModelLoading):
+        storage.get(17)
+    released.set()
+    for _ in range(50):
+        if 17 in storage._MODELS:
+            break
+        time.sleep(0.1)
+    assert type(storage.get(17).model) == Model